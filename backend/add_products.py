@@ -1,6 +1,10 @@
 # backend/add_products.py
 from app import create_app
+from change_log import rebuild_change_log
+from facets import rebuild_facets
 from models import db, Product
+from popularity import rebuild_popularity
+from specs import backfill_specs
 
 app = create_app()
 
@@ -27,4 +31,11 @@ with app.app_context():
     ]
 
     db.session.bulk_save_objects(new_products)
-    db.session.commit()
\ No newline at end of file
+    db.session.commit()
+    backfill_specs()
+
+    # bulk_save_objects идет в обход ORM-событий, поэтому фасеты, журнал изменений
+    # и популярность пересчитываем целиком
+    rebuild_facets()
+    rebuild_change_log()
+    rebuild_popularity()
\ No newline at end of file
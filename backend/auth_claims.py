@@ -0,0 +1,151 @@
+# backend/auth_claims.py
+from functools import wraps
+
+from flask import jsonify, request
+from flask_jwt_extended import get_jwt, verify_jwt_in_request
+
+from catalog_cache import LRUCache
+from models import db, User
+from sqlalchemy import event, inspect, text
+from sqlalchemy.orm import Session
+
+# Администратор — пользователь с is_admin или служебный admin@example.com
+# (так права определялись раньше, по email)
+ADMIN_EMAIL = 'admin@example.com'
+ROLE_ADMIN = 'admin'
+ROLE_CUSTOMER = 'customer'
+
+# Поля пользователя, от которых зависят claims токена: их изменение повышает token_version
+CLAIM_COLUMNS = ('email', 'is_admin')
+
+# Текущая token_version по id пользователя: проверка отзыва токена не ходит в БД на каждый запрос.
+# Смена роли в этом процессе видна сразу, в других — не позже чем через AUTH_TOKEN_VERSION_TTL
+token_versions = LRUCache('token_versions', maxsize=10000, ttl=60)
+# Колонки пользователя по (id, token_version) для current_user. Хэш пароля в кэш не попадает
+user_cache = LRUCache('users', maxsize=10000, ttl=60)
+USER_CACHE_COLUMNS = tuple(attr.key for attr in User.__mapper__.column_attrs if attr.key != 'password')
+
+
+def init_auth_claims(app):
+    token_versions.configure(token_versions.maxsize, app.config['AUTH_TOKEN_VERSION_TTL'])
+    user_cache.configure(user_cache.maxsize, app.config['AUTH_USER_CACHE_TTL'])
+
+
+def user_is_admin(user):
+    return bool(user.is_admin) or user.email == ADMIN_EMAIL
+
+
+# Claims, которые кладутся в токен при входе и регистрации
+def user_claims(user):
+    admin = user_is_admin(user)
+    return {
+        'email': user.email,
+        'role': ROLE_ADMIN if admin else ROLE_CUSTOMER,
+        'is_admin': admin,
+        'ver': user.token_version or 0,
+    }
+
+
+def current_token_version(user_id):
+    found, version = token_versions.get(user_id)
+    if not found:
+        row = db.session.query(User.token_version).filter(User.id == user_id).first()
+        version = (row[0] or 0) if row else None
+        token_versions.set(user_id, version)
+    return version
+
+
+# token_in_blocklist_loader: токен отозван, если пользователя нет или его роль
+# менялась после выдачи токена
+def is_token_revoked(jwt_header, jwt_payload):
+    try:
+        user_id = int(jwt_payload['sub'])
+    except (KeyError, TypeError, ValueError):
+        return True
+    version = current_token_version(user_id)
+    return version is None or jwt_payload.get('ver', 0) < version
+
+
+def load_user_row(user_id, version):
+    found, row = user_cache.get((user_id, version))
+    if not found:
+        user = db.session.get(User, user_id)
+        row = {key: getattr(user, key) for key in USER_CACHE_COLUMNS} if user else None
+        user_cache.set((user_id, version), row)
+    return row
+
+
+class LazyUser:
+    # Что user_lookup_loader отдает вместо User: пользователь читается, только когда
+    # обработчик обращается к current_user. Колонки берутся из user_cache, остальное
+    # (пароль, связи orders/returns) — из ORM-объекта сессии запроса
+
+    def __init__(self, user_id, version):
+        self.id = user_id
+        self._version = version
+        self._row = None
+
+    def __getattr__(self, name):
+        if name in USER_CACHE_COLUMNS:
+            if self._row is None:
+                self._row = load_user_row(self.id, self._version)
+                if self._row is None:
+                    raise AttributeError(f'User {self.id} not found')
+            return self._row[name]
+        return getattr(self.orm(), name)
+
+    def orm(self):
+        return db.session.get(User, self.id)
+
+
+# user_lookup_loader: проверка токена больше не читает пользователя из БД на каждый запрос
+def lazy_user_lookup(jwt_header, jwt_payload):
+    return LazyUser(int(jwt_payload['sub']), jwt_payload.get('ver', 0))
+
+
+# Доступ только для администратора, по проверенным claims токена, без запроса пользователя из БД
+def admin_required(fn):
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        verify_jwt_in_request()
+        # Preflight-запросы CORS проходят без токена, как и в jwt_required
+        if request.method != 'OPTIONS' and not get_jwt().get('is_admin'):
+            return jsonify({'error': 'Unauthorized access'}), 403
+        return fn(*args, **kwargs)
+    return wrapper
+
+
+@event.listens_for(Session, 'before_flush')
+def _bump_token_version(session, flush_context, instances):
+    for obj in session.dirty | session.deleted:
+        if not isinstance(obj, User):
+            continue
+        state = inspect(obj)
+        if obj not in session.deleted and any(state.attrs[key].history.has_changes() for key in CLAIM_COLUMNS):
+            obj.token_version = (obj.token_version or 0) + 1
+        session.info.setdefault('changed_users', set()).add(obj.id)
+
+
+# После commit этот процесс сразу забывает версию токенов и закэшированные колонки
+# измененных пользователей, другие процессы — по истечении TTL
+@event.listens_for(Session, 'after_commit')
+def _forget_changed_users(session):
+    user_ids = session.info.pop('changed_users', None)
+    if not user_ids:
+        return
+    for user_id in user_ids:
+        token_versions.delete(user_id)
+    user_cache.delete_where(lambda key, tags: key[0] in user_ids)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changed_users(session):
+    session.info.pop('changed_users', None)
+
+
+# Добавляет колонку token_version в уже созданную таблицу пользователей
+def ensure_token_version():
+    columns = {column['name'] for column in inspect(db.engine).get_columns('user')}
+    if 'token_version' not in columns:
+        db.session.execute(text('ALTER TABLE "user" ADD COLUMN token_version INTEGER NOT NULL DEFAULT 0'))
+        db.session.commit()
@@ -0,0 +1,14 @@
+# backend/backfill_specs.py
+# Разбирает характеристики товаров ('16GB RAM', '65"', '120Hz') из названия и описания
+# в колонку attributes. По умолчанию только для товаров без характеристик, с --all — для всех
+import sys
+
+from app import create_app
+from specs import backfill_specs, ensure_specs
+
+app = create_app()
+
+with app.app_context():
+    ensure_specs()
+    updated = backfill_specs(overwrite='--all' in sys.argv)
+    print(f"Product specs updated: {updated}")
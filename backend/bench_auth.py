@@ -0,0 +1,126 @@
+# backend/bench_auth.py
+# Сколько SQL-запросов делает каждый защищенный маршрут из-за аутентификации:
+# с прежней загрузкой пользователя в user_lookup_loader на каждый запрос (eager)
+# и с ленивой загрузкой через current_user (lazy).
+#
+#   python bench_auth.py
+#
+# Используется временная SQLite-база; каждый маршрут вызывается BENCH_REPEAT раз,
+# печатается среднее число запросов на вызов.
+#
+# Затем — время проверки токена (verify_jwt_in_request) на запрос без кэша
+# проверенных токенов и с ним, BENCH_VERIFY_ROUNDS проверок
+import os
+import tempfile
+import time
+
+_db_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+os.environ['DATABASE_URL'] = f"sqlite:///{_db_file.name}"
+
+from app import create_app
+from auth_claims import lazy_user_lookup, user_claims
+from flask_jwt_extended import create_access_token, verify_jwt_in_request
+from models import db, Cart, CartItem, Order, OrderItem, Product, Return, ReturnItem, User
+from sqlalchemy import event
+
+REPEAT = int(os.getenv('BENCH_REPEAT', 20))
+VERIFY_ROUNDS = int(os.getenv('BENCH_VERIFY_ROUNDS', 20000))
+ROUTES = [
+    ('GET', '/api/cart/'),
+    ('GET', '/api/orders/'),
+    ('GET', '/api/orders/1'),
+    ('GET', '/api/returns/'),
+    ('GET', '/api/returns/1'),
+]
+
+
+def eager_user_lookup(jwt_header, jwt_data):
+    return User.query.filter_by(id=jwt_data['sub']).one_or_none()
+
+
+def seed(app):
+    with app.app_context():
+        db.create_all()
+        user = User(email='bench@example.com', password='-')
+        product = Product(name='Samsung QLED S90', price=150_000.0, stock=100, category='TV')
+        db.session.add_all([user, product])
+        db.session.flush()
+
+        cart = Cart(user_id=user.id)
+        order = Order(user_id=user.id, shipping_address='Almaty', delivery_method='courier',
+                      total_amount=150_000.0, status='delivered')
+        db.session.add_all([cart, order])
+        db.session.flush()
+        db.session.add(CartItem(cart_id=cart.id, product_id=product.id, quantity=1))
+        item = OrderItem(order_id=order.id, product_id=product.id, quantity=1, price=product.price)
+        db.session.add(item)
+        db.session.flush()
+
+        return_request = Return(order_id=order.id, user_id=user.id, reason='Defect')
+        db.session.add(return_request)
+        db.session.flush()
+        db.session.add(ReturnItem(return_id=return_request.id, order_item_id=item.id, quantity=1))
+        db.session.commit()
+        return create_access_token(identity=str(user.id), additional_claims=user_claims(user))
+
+
+def count_queries(app, token, loader):
+    app.extensions['flask-jwt-extended']._user_lookup_callback = loader
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {token}'}
+    counter = {'queries': 0}
+
+    def count_query(conn, cursor, statement, parameters, context, executemany):
+        counter['queries'] += 1
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', count_query)
+    result = {}
+    try:
+        for method, url in ROUTES:
+            counter['queries'] = 0
+            for _ in range(REPEAT):
+                response = client.open(url, method=method, headers=headers)
+                response.get_data()
+                if response.status_code != 200:
+                    raise RuntimeError(f"{method} {url}: {response.status_code} {response.get_data(as_text=True)}")
+            result[url] = counter['queries'] / REPEAT
+    finally:
+        event.remove(engine, 'before_cursor_execute', count_query)
+    return result
+
+
+def verify_overhead(app, token, cache_size):
+    app.config['AUTH_TOKEN_CACHE_SIZE'] = cache_size
+    headers = {'Authorization': f'Bearer {token}'}
+    with app.test_request_context('/api/orders/', headers=headers):
+        verify_jwt_in_request()
+        started = time.perf_counter()
+        for _ in range(VERIFY_ROUNDS):
+            verify_jwt_in_request()
+        return (time.perf_counter() - started) / VERIFY_ROUNDS
+
+
+def main():
+    app = create_app()
+    try:
+        token = seed(app)
+        eager = count_queries(app, token, eager_user_lookup)
+        lazy = count_queries(app, token, lazy_user_lookup)
+
+        print(f"{'route':<22}{'eager':>8}{'lazy':>8}")
+        for method, url in ROUTES:
+            print(f"{method + ' ' + url:<22}{eager[url]:>8.2f}{lazy[url]:>8.2f}")
+
+        cache_size = app.config['AUTH_TOKEN_CACHE_SIZE']
+        uncached = verify_overhead(app, token, 0)
+        cached = verify_overhead(app, token, cache_size)
+        print(f"\ntoken verification per request: no cache {uncached * 1e6:.1f} us, "
+              f"cache {cached * 1e6:.1f} us ({uncached / cached:.1f}x)")
+    finally:
+        os.unlink(_db_file.name)
+
+
+if __name__ == '__main__':
+    main()
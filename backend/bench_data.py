@@ -0,0 +1,26 @@
+# backend/bench_data.py
+# Синтетический каталог для скриптов bench_*.py
+import random
+
+BRANDS = ['Samsung', 'Apple', 'Xiaomi', 'Huawei', 'Sony', 'LG', 'Lenovo', 'Dell', 'Asus', 'Acer', 'HP', 'Philips']
+CATEGORIES = ['Phones', 'TV', 'Laptops', 'Tablets', 'Audio', 'Cameras', 'Monitors', 'Accessories']
+WORDS = ['pro', 'max', 'ultra', 'mini', 'qled', 'oled', 'gaming', 'smart', 'wireless', 'camera', 'chip',
+         'display', 'battery', 'charging', 'processor', 'memory', 'storage', 'hdr', 'touch', 'edition',
+         'bluetooth', 'speaker', 'keyboard', 'refresh', 'cooling', 'aluminium', 'waterproof', 'stylus',
+         'fingerprint', 'ambilight', 'graphics', 'portable', 'studio', 'noise', 'cancelling', 'zoom',
+         'lens', 'sensor', 'panel', 'matte', 'glossy', 'backlit', 'dolby', 'atmos', 'quantum', 'neural',
+         'engine', 'fast', 'slim', 'light', 'premium', 'classic', 'series', 'plus', 'lite', 'core']
+
+
+def synthetic_rows(count, seed=42, description_words=(8, 30)):
+    rnd = random.Random(seed)
+    for _ in range(count):
+        brand = rnd.choice(BRANDS)
+        yield {
+            'name': f"{brand} {' '.join(rnd.sample(WORDS, 2)).title()} {rnd.choice('XSGMA')}{rnd.randint(1, 999)}",
+            'description': ' '.join(rnd.choice(WORDS) for _ in range(rnd.randint(*description_words))),
+            'price': round(rnd.uniform(5_000, 1_500_000), 2),
+            'stock': rnd.randint(0, 50),
+            'category': rnd.choice(CATEGORIES),
+            'image_url': 'https://via.placeholder.com/300',
+        }
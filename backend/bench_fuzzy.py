@@ -0,0 +1,44 @@
+# backend/bench_fuzzy.py
+# Память и задержка триграммного индекса (search_mode=fuzzy) на синтетическом каталоге.
+# База данных не нужна: индекс строится прямо из сгенерированных строк.
+#
+#   python bench_fuzzy.py
+import os
+import statistics
+import time
+
+from bench_data import synthetic_rows
+from search_index import TrigramIndex
+
+SIZES = [int(size) for size in os.getenv('BENCH_SIZES', '10000,50000,100000').split(',')]
+REPEATS = int(os.getenv('BENCH_REPEATS', 200))
+
+QUERIES = ['samsng qled', 'lenvo gamng', 'wirless speker', 'macbok pro', 'dolby atmos', 'xiaomi']
+
+
+def main():
+    print(f"{'products':>10} {'build, s':>10} {'MB':>8} {'MB per 10k':>11} {'p50, ms':>9} {'p95, ms':>9}")
+    for size in SIZES:
+        rows = [dict(row, id=i) for i, row in enumerate(synthetic_rows(size), start=1)]
+
+        index = TrigramIndex()
+        started = time.perf_counter()
+        index.build(rows)
+        build_time = time.perf_counter() - started
+        stats = index.stats()
+
+        timings = []
+        for _ in range(REPEATS):
+            for query in QUERIES:
+                started = time.perf_counter()
+                index.search(query)
+                timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+
+        print(f"{size:>10} {build_time:>10.2f} {stats['bytes'] / 2 ** 20:>8.1f} "
+              f"{stats['bytes_per_10k_products'] / 2 ** 20:>11.2f} "
+              f"{statistics.median(timings):>9.3f} {timings[int(len(timings) * 0.95) - 1]:>9.3f}")
+
+
+if __name__ == '__main__':
+    main()
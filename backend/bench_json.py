@@ -0,0 +1,57 @@
+# backend/bench_json.py
+# Сериализация списка товаров (проекция "card") на 1k, 10k и 100k элементов:
+# стандартный провайдер Flask (сортировка ключей), CatalogJSONProvider на словарях
+# и CatalogJSONProvider с закэшированными JSON-фрагментами товаров.
+#
+#   python bench_json.py
+import os
+import time
+
+os.environ.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+
+from app import create_app
+from bench_data import synthetic_rows
+from catalog_cache import fragment_cache
+from catalog_version import current_version
+from flask.json.provider import DefaultJSONProvider
+from json_provider import product_fragments
+from routes.products import PROJECTIONS
+
+SIZES = (1_000, 10_000, 100_000)
+REPEAT = int(os.getenv('BENCH_REPEAT', 5))
+FIELDS = PROJECTIONS['card']
+
+
+def best_of(fn):
+    timings = []
+    for _ in range(REPEAT):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings) * 1000
+
+
+def main():
+    app = create_app()
+    default_provider = DefaultJSONProvider(app)
+    fragment_cache.configure(max(SIZES), 3600)
+
+    with app.app_context():
+        for size in SIZES:
+            rows = [(id, row['name'], row['price'], row['stock'], row['category'], row['image_url'])
+                    for id, row in enumerate(synthetic_rows(size), start=1)]
+            products = [dict(zip(FIELDS, row)) for row in rows]
+            version = current_version()
+            fragments = product_fragments(FIELDS, rows, version)
+
+            baseline = best_of(lambda: default_provider.response({'products': products}))
+            compact = best_of(lambda: app.json.response({'products': products}))
+            cached = best_of(lambda: app.json.response({'products': product_fragments(FIELDS, rows, version)}))
+            spliced = best_of(lambda: app.json.response({'products': fragments}))
+
+            print(f"{size:>7} items: default {baseline:8.2f} ms | compact {compact:8.2f} ms | "
+                  f"fragments (cache lookup + splice) {cached:8.2f} ms | splice only {spliced:7.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
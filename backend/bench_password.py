@@ -0,0 +1,79 @@
+# backend/bench_password.py
+# Пропускная способность входа (POST /api/auth/login) при разной стоимости хэша пароля:
+# для каждого числа итераций pbkdf2 из BENCH_ITERATIONS BENCH_CLIENTS потоков делают
+# по BENCH_LOGINS входов; печатаются входы в секунду и задержки проверки пароля из
+# password_hasher.stats().
+#
+#   python bench_password.py
+#
+# Используется временная SQLite-база; размер пула — PASSWORD_HASH_WORKERS / PASSWORD_HASH_QUEUE
+import os
+import tempfile
+import threading
+import time
+
+_db_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+os.environ['DATABASE_URL'] = f"sqlite:///{_db_file.name}"
+
+import logging
+
+from app import create_app
+from models import db, User
+from password_hashing import password_hasher
+
+ITERATIONS = [int(value) for value in os.getenv('BENCH_ITERATIONS', '100000,300000,600000,1000000').split(',')]
+CLIENTS = int(os.getenv('BENCH_CLIENTS', 8))
+LOGINS = int(os.getenv('BENCH_LOGINS', 5))
+
+
+def run(app, iterations):
+    method = f"pbkdf2:sha256:{iterations}"
+    password_hasher.configure(method, app.config['PASSWORD_HASH_WORKERS'], app.config['PASSWORD_HASH_QUEUE'])
+    with app.app_context():
+        user = User.query.filter_by(email='bench@example.com').one()
+        user.password = password_hasher.hash('bench-password')
+        db.session.commit()
+
+    statuses = []
+    lock = threading.Lock()
+
+    def client():
+        test_client = app.test_client()
+        for _ in range(LOGINS):
+            response = test_client.post('/api/auth/login',
+                                        json={'email': 'bench@example.com', 'password': 'bench-password'})
+            with lock:
+                statuses.append(response.status_code)
+
+    threads = [threading.Thread(target=client) for _ in range(CLIENTS)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    verify = password_hasher.stats()['latency']['verify']
+    ok = statuses.count(200)
+    print(f"{iterations:>10}{ok / elapsed:>12.1f}{verify['p50_ms']:>10.1f}{verify['p95_ms']:>10.1f}"
+          f"{len(statuses) - ok:>10}")
+
+
+def main():
+    logging.disable(logging.CRITICAL)
+    app = create_app()
+    try:
+        with app.app_context():
+            db.create_all()
+            db.session.add(User(email='bench@example.com', password='-'))
+            db.session.commit()
+
+        print(f"{'iterations':>10}{'logins/s':>12}{'p50 ms':>10}{'p95 ms':>10}{'rejected':>10}")
+        for iterations in ITERATIONS:
+            run(app, iterations)
+    finally:
+        os.unlink(_db_file.name)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+# backend/bench_projection.py
+# Объем ответа и время выборки+сериализации списка товаров для проекций
+# "full" (все поля) и "card" (без описания) на каталоге с длинными описаниями.
+#
+#   python bench_projection.py
+import os
+import tempfile
+import time
+
+_db_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+os.environ['DATABASE_URL'] = f"sqlite:///{_db_file.name}"
+
+from app import create_app
+from flask import current_app
+from bench_data import synthetic_rows
+from models import db, Product
+from routes.products import MAX_PAGE_SIZE, PROJECTIONS, load_page
+from sqlalchemy import insert
+
+PRODUCT_COUNT = int(os.getenv('BENCH_PRODUCTS', 10_000))
+# Описание интернет-магазина электроники: от одного до нескольких абзацев
+DESCRIPTION_WORDS = (60, 250)
+FILTERS = {'search': '', 'search_mode': None, 'category': None, 'min_price': None, 'max_price': None}
+
+
+def walk_catalog(fields):
+    pages = 0
+    payload = 0
+    cursor = ''
+    started = time.perf_counter()
+    while True:
+        page = load_page(FILTERS, 'newest', cursor, MAX_PAGE_SIZE, fields)
+        payload += len(current_app.json.dumps(page['products']).encode())
+        pages += 1
+        cursor = page['next_cursor']
+        if not cursor:
+            break
+    return pages, payload, time.perf_counter() - started
+
+
+def main():
+    app = create_app()
+    try:
+        with app.app_context():
+            db.create_all()
+            db.session.execute(insert(Product), list(synthetic_rows(PRODUCT_COUNT, description_words=DESCRIPTION_WORDS)))
+            db.session.commit()
+
+            print(f"{PRODUCT_COUNT} products, pages of {MAX_PAGE_SIZE}")
+            results = {}
+            for name in ('full', 'card'):
+                walk_catalog(PROJECTIONS[name])
+                pages, payload, elapsed = walk_catalog(PROJECTIONS[name])
+                results[name] = (payload, elapsed)
+                print(f"{name:>5}: {payload / 2 ** 20:7.2f} MB total, {payload / PRODUCT_COUNT:6.0f} B/product, "
+                      f"{elapsed * 1000 / pages:6.2f} ms/page (query + serialization)")
+
+            full, card = results['full'], results['card']
+            print(f"card vs full: payload -{(1 - card[0] / full[0]) * 100:.0f}%, time -{(1 - card[1] / full[1]) * 100:.0f}%")
+    finally:
+        os.unlink(_db_file.name)
+
+
+if __name__ == '__main__':
+    main()
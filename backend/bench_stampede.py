@@ -0,0 +1,84 @@
+# backend/bench_stampede.py
+# Нагрузка "промо-акции": много одновременных одинаковых запросов страницы категории
+# при холодном кэше. Считает, сколько SQL-запросов к каталогу дошло до БД
+# со склейкой запросов (single-flight) и без нее.
+#
+#   python bench_stampede.py
+#
+# Используется временная SQLite-база; задержка BENCH_DB_LATENCY_MS на каждый запрос
+# имитирует сетевой round trip до PostgreSQL, иначе запросы не успевают пересечься.
+import os
+import tempfile
+import threading
+import time
+
+_db_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+os.environ['DATABASE_URL'] = f"sqlite:///{_db_file.name}"
+
+from app import create_app
+from bench_data import synthetic_rows
+from catalog_cache import CACHES
+from models import db, Product
+from sqlalchemy import event, insert
+
+CONCURRENCY = int(os.getenv('BENCH_CONCURRENCY', 200))
+DB_LATENCY = int(os.getenv('BENCH_DB_LATENCY_MS', 50)) / 1000
+URL = '/api/products/?category=TV&sort=price_asc&limit=24'
+
+
+def run(app, single_flight):
+    app.config['CATALOG_SINGLE_FLIGHT'] = single_flight
+    for cache in CACHES:
+        cache.clear()
+
+    counter = {'product': 0, 'product_facet': 0}
+    lock = threading.Lock()
+
+    def count_query(conn, cursor, statement, parameters, context, executemany):
+        table = 'product_facet' if 'FROM product_facet' in statement else 'product'
+        with lock:
+            counter[table] += 1
+        time.sleep(DB_LATENCY)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', count_query)
+
+    barrier = threading.Barrier(CONCURRENCY)
+    statuses = []
+
+    def worker():
+        client = app.test_client()
+        barrier.wait()
+        statuses.append(client.get(URL).status_code)
+
+    threads = [threading.Thread(target=worker) for _ in range(CONCURRENCY)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    event.remove(engine, 'before_cursor_execute', count_query)
+    ok = statuses.count(200)
+    print(f"single_flight={str(single_flight):<5}  requests={CONCURRENCY}  ok={ok}  "
+          f"page queries={counter['product']}  facet queries={counter['product_facet']}  wall={elapsed:.2f}s")
+
+
+def main():
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        db.session.execute(insert(Product), [dict(row, category='TV') for row in synthetic_rows(2000)])
+        db.session.commit()
+
+    try:
+        run(app, single_flight=False)
+        run(app, single_flight=True)
+    finally:
+        os.unlink(_db_file.name)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+# backend/bench_stream.py
+# Рост памяти процесса при потоковой выдаче GET /api/admin/orders на большом числе заказов.
+# Замер делается на 10% и на 100% заказов: при потоковой выдаче рост RSS не должен
+# зависеть от числа строк. Скрипт завершается с кодом 1, если рост больше BENCH_MAX_RSS_GROWTH_MB.
+#
+#   python bench_stream.py
+#   BENCH_ORDERS=100000 python bench_stream.py
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+# Модульный app при импорте не должен требовать PostgreSQL; сам замер идет во временной базе
+os.environ.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+
+from app import create_app
+from auth_claims import user_claims
+from flask_jwt_extended import create_access_token
+from models import db, Order, OrderItem, Product, User
+from sqlalchemy import func, insert
+
+ORDER_COUNT = int(os.getenv('BENCH_ORDERS', 1_000_000))
+MAX_RSS_GROWTH = int(os.getenv('BENCH_MAX_RSS_GROWTH_MB', 64)) * 2 ** 20
+INSERT_BATCH = 20_000
+
+
+def current_rss():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        # Без /proc доступен только пик RSS (Linux — КБ, macOS — байты)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def add_orders(user_id, product_id, count):
+    now = datetime.utcnow()
+    first_id = (db.session.query(func.max(Order.id)).scalar() or 0) + 1
+    for start in range(first_id, first_id + count, INSERT_BATCH):
+        ids = range(start, min(start + INSERT_BATCH, first_id + count))
+        db.session.execute(insert(Order), [{
+            'id': id, 'user_id': user_id, 'status': 'pending', 'created_at': now, 'updated_at': now,
+            'shipping_address': f"Almaty, Abay ave. {id}", 'delivery_method': 'courier',
+            'total_amount': 150_000.0,
+        } for id in ids])
+        db.session.execute(insert(OrderItem), [
+            {'order_id': id, 'product_id': product_id, 'quantity': 1, 'price': 150_000.0} for id in ids
+        ])
+        db.session.commit()
+
+
+def stream_orders(client, token):
+    samples = []
+    stop = threading.Event()
+
+    def sample():
+        while not stop.is_set():
+            samples.append(current_rss())
+            time.sleep(0.05)
+
+    started = time.perf_counter()
+    response = client.get('/api/admin/orders', headers={'Authorization': f"Bearer {token}"}, buffered=False)
+    assert response.status_code == 200, response.status_code
+
+    chunks = iter(response.response)
+    size = len(next(chunks))
+    # Базой считается RSS после первой пачки: к этому моменту запрос уже выполнен
+    # и все модули, кэши и соединения прогреты
+    baseline = current_rss()
+    sampler = threading.Thread(target=sample)
+    sampler.start()
+    try:
+        for chunk in chunks:
+            size += len(chunk)
+    finally:
+        stop.set()
+        sampler.join()
+        response.close()
+
+    return size, max(samples + [current_rss()]) - baseline, time.perf_counter() - started
+
+
+# Заказы добавляются в два приема (10% и 100% order_count) во временную SQLite-базу,
+# после каждого весь список выгружается потоком. Возвращает [(заказов, байт, рост RSS, секунд)]
+def measure(order_count):
+    db_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+    previous_url = os.environ.get('DATABASE_URL')
+    os.environ['DATABASE_URL'] = f"sqlite:///{db_file.name}"
+    try:
+        app = create_app()
+        client = app.test_client()
+        with app.app_context():
+            db.create_all()
+            admin = User(email='admin@example.com', password='-')
+            product = Product(name='Samsung QLED S90', price=150_000.0, stock=10, category='TV')
+            db.session.add_all([admin, product])
+            db.session.commit()
+            token = create_access_token(identity=str(admin.id), additional_claims=user_claims(admin))
+
+            results = []
+            loaded = 0
+            for count in (order_count // 10, order_count):
+                add_orders(admin.id, product.id, count - loaded)
+                loaded = count
+                results.append((count, *stream_orders(client, token)))
+            db.session.remove()
+            db.engine.dispose()
+        return results
+    finally:
+        if previous_url is None:
+            os.environ.pop('DATABASE_URL', None)
+        else:
+            os.environ['DATABASE_URL'] = previous_url
+        os.unlink(db_file.name)
+
+
+def main():
+    worst = 0
+    for count, size, growth, elapsed in measure(ORDER_COUNT):
+        worst = max(worst, growth)
+        print(f"{count:>9} orders: {size / 2 ** 20:8.1f} MB streamed in {elapsed:6.1f} s, "
+              f"RSS growth {growth / 2 ** 20:6.1f} MB")
+
+    if worst > MAX_RSS_GROWTH:
+        print(f"FAIL: RSS grew by {worst / 2 ** 20:.1f} MB, limit {MAX_RSS_GROWTH / 2 ** 20:.0f} MB")
+        sys.exit(1)
+    print(f"OK: RSS growth stays under {MAX_RSS_GROWTH / 2 ** 20:.0f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+# backend/catalog_cache.py
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+
+from catalog_events import on_product_change
+from catalog_version import current_version, on_remote_change
+from facets import facet_key, price_bucket
+from single_flight import SingleFlight
+from specs import matches_specs
+
+
+class LRUCache:
+    # Ограниченный по размеру кэш с вытеснением давно не использованных записей
+    # и временем жизни каждой записи
+
+    def __init__(self, name, maxsize=1024, ttl=60, negative_ttl=None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # Время жизни закэшированного отсутствия значения (None), например 404
+        self.negative_ttl = negative_ttl or ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._counters = dict.fromkeys(('hits', 'misses', 'evictions', 'expirations', 'invalidations'), 0)
+
+    def configure(self, maxsize, ttl, negative_ttl=None):
+        with self._lock:
+            self.maxsize = maxsize
+            self.ttl = ttl
+            self.negative_ttl = negative_ttl or ttl
+            self._evict()
+
+    # Возвращает (найдено, значение): None тоже может быть закэшированным значением
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._counters['misses'] += 1
+                return False, None
+
+            value, expires_at, _ = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self._counters['expirations'] += 1
+                self._counters['misses'] += 1
+                return False, None
+
+            self._entries.move_to_end(key)
+            self._counters['hits'] += 1
+            return True, value
+
+    def set(self, key, value, tags=None):
+        ttl = self.negative_ttl if value is None else self.ttl
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl, tags)
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def _evict(self):
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self._counters['evictions'] += 1
+
+    def delete(self, key):
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._counters['invalidations'] += 1
+
+    # Удаляет записи, для которых predicate(key, tags) истинно
+    def delete_where(self, predicate):
+        with self._lock:
+            stale = [key for key, (_, _, tags) in self._entries.items() if predicate(key, tags)]
+            for key in stale:
+                del self._entries[key]
+            self._counters['invalidations'] += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._counters['invalidations'] += len(self._entries)
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self._counters['hits'] + self._counters['misses']
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                **self._counters,
+                'hit_ratio': round(self._counters['hits'] / lookups, 4) if lookups else None,
+            }
+
+
+# Карточки товаров по id (None — закэшированный 404), страницы списка по нормализованному
+# запросу, фасеты по фильтрам сайдбара и закодированный JSON товаров по (поля, id, версия)
+product_cache = LRUCache('product', maxsize=4096, ttl=300, negative_ttl=30)
+list_cache = LRUCache('list', maxsize=1024, ttl=60)
+facet_cache = LRUCache('facets', maxsize=256, ttl=300)
+fragment_cache = LRUCache('fragments', maxsize=20000, ttl=300)
+
+CACHES = (product_cache, list_cache, facet_cache, fragment_cache)
+
+catalog_flight = SingleFlight()
+
+# Метка записей facet_cache, посчитанных по товарам под поиск и характеристики
+SEARCH_FACETS = 'search'
+
+
+def init_catalog_cache(app):
+    product_cache.configure(app.config['CATALOG_CACHE_SIZE'], app.config['CATALOG_CACHE_TTL'],
+                            app.config['CATALOG_CACHE_NEGATIVE_TTL'])
+    list_cache.configure(app.config['CATALOG_LIST_CACHE_SIZE'], app.config['CATALOG_LIST_CACHE_TTL'])
+    facet_cache.configure(app.config['CATALOG_LIST_CACHE_SIZE'], app.config['CATALOG_CACHE_TTL'])
+    fragment_cache.configure(app.config['CATALOG_FRAGMENT_CACHE_SIZE'], app.config['CATALOG_CACHE_TTL'])
+
+
+def cache_stats():
+    return {**{cache.name: cache.stats() for cache in CACHES}, 'single_flight': catalog_flight.stats()}
+
+
+# Подходит ли товар под фильтры закэшированной страницы. Для текстового поиска
+# в Python проверяется только ILIKE, полнотекстовый и нечеткий поиск считаются совпавшими
+def matches_filters(product, filters):
+    if product is None:
+        return False
+    if filters['categories'] and product.get('category') not in filters['categories']:
+        return False
+    if filters['in_stock'] and not (product.get('stock') or 0) > 0:
+        return False
+
+    price = product.get('price') or 0
+    if filters['min_price'] is not None and price < filters['min_price']:
+        return False
+    if filters['max_price'] is not None and price > filters['max_price']:
+        return False
+    if filters['price_buckets'] and price_bucket(price) not in filters['price_buckets']:
+        return False
+    if filters['specs'] and not matches_specs(product.get('attributes'), filters['specs']):
+        return False
+
+    search = filters['search']
+    if search and filters['search_mode'] == 'ilike':
+        search = search.lower()
+        return search in (product.get('name') or '').lower() or search in (product.get('description') or '').lower()
+    return True
+
+
+def _facet_state(product):
+    return None if product is None else facet_key(product.get('category'), product.get('price'), product.get('stock'))
+
+
+@on_product_change
+def _invalidate_catalog_cache(changes):
+    for change in changes:
+        product_cache.delete(change.product_id)
+
+    list_cache.delete_where(lambda key, filters: any(
+        matches_filters(change.previous, filters) or matches_filters(change.data, filters)
+        for change in changes
+    ))
+
+    # Фасеты зависят только от категории, ценового диапазона и наличия товара,
+    # а посчитанные под поиск и характеристики — от любых полей товара
+    if any(_facet_state(change.previous) != _facet_state(change.data) for change in changes):
+        facet_cache.clear()
+    else:
+        facet_cache.delete_where(lambda key, tags: tags == SEARCH_FACETS)
+
+
+# Для изменений из других процессов известны только id товаров: страницы списка
+# и фасеты сбрасываются целиком
+@on_remote_change
+def _invalidate_remote_changes(product_ids):
+    for product_id in product_ids:
+        product_cache.delete(product_id)
+    list_cache.clear()
+    facet_cache.clear()
+
+
+# Читает значение из кэша или загружает его. Одновременные промахи по одному ключу
+# склеиваются: запрос к БД выполняет только первый, остальные ждут его результат.
+# Если за время загрузки каталог изменился, результат не кэшируется:
+# он мог быть прочитан до commit и уже устарел
+def read_through(cache, key, loader, tags=None):
+    found, value = cache.get(key)
+    if found:
+        return value
+
+    def load():
+        version = current_version()
+        value = loader()
+        if current_version() == version:
+            cache.set(key, value, tags=tags)
+        return value
+
+    if not current_app.config['CATALOG_SINGLE_FLIGHT']:
+        return load()
+    return catalog_flight.do((cache.name, key), load)
+
+
+# То же для набора ключей: промахи загружаются одним вызовом loader(keys) -> {key: value},
+# отсутствующие в результате ключи кэшируются как None
+def read_through_many(cache, keys, loader):
+    values = {}
+    misses = []
+    for key in keys:
+        found, value = cache.get(key)
+        if found:
+            values[key] = value
+        else:
+            misses.append(key)
+
+    if misses:
+        version = current_version()
+        loaded = loader(misses)
+        fresh = current_version() == version
+        for key in misses:
+            values[key] = loaded.get(key)
+            if fresh:
+                cache.set(key, values[key])
+    return values
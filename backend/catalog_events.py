@@ -0,0 +1,81 @@
+# backend/catalog_events.py
+from collections import namedtuple
+
+from models import Product
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+# Подписчики на изменения каталога. Каждый получает список ProductChange:
+# op — 'upsert' или 'delete', data — колонки товара после транзакции (None для удаления),
+# previous — колонки до транзакции (None для нового товара).
+# Вызываются только после успешного commit, поэтому откаченные изменения не видны.
+# Массовые query.update()/query.delete() ORM-события не порождают.
+ProductChange = namedtuple('ProductChange', 'op product_id data previous')
+
+_listeners = []
+
+
+def on_product_change(fn):
+    _listeners.append(fn)
+    return fn
+
+
+def product_data(product):
+    return {attr.key: getattr(product, attr.key) for attr in Product.__mapper__.column_attrs}
+
+
+def previous_data(product):
+    # В after_flush история атрибутов еще описывает состояние до flush
+    state = inspect(product)
+    data = {}
+    for attr in Product.__mapper__.column_attrs:
+        history = state.attrs[attr.key].history
+        data[attr.key] = history.deleted[0] if history.deleted else getattr(product, attr.key)
+    return data
+
+
+def _pending(session):
+    return session.info.setdefault('product_changes', {})
+
+
+def _record(changes, product_id, op, data, previous):
+    # Если товар менялся несколькими flush в одной транзакции, previous остается от первого
+    if product_id in changes:
+        previous = changes[product_id].previous
+    changes[product_id] = ProductChange(op, product_id, data, previous)
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_product_changes(session, flush_context):
+    changes = _pending(session)
+
+    for obj in session.new:
+        if isinstance(obj, Product):
+            _record(changes, obj.id, 'upsert', product_data(obj), None)
+
+    for obj in session.dirty:
+        if isinstance(obj, Product) and session.is_modified(obj, include_collections=False):
+            _record(changes, obj.id, 'upsert', product_data(obj), previous_data(obj))
+
+    for obj in session.deleted:
+        if isinstance(obj, Product):
+            _record(changes, obj.id, 'delete', None, product_data(obj))
+
+
+@event.listens_for(Session, 'after_commit')
+def _dispatch_product_changes(session):
+    changes = session.info.pop('product_changes', None)
+    if not changes:
+        return
+
+    batch = list(changes.values())
+    for listener in _listeners:
+        try:
+            listener(batch)
+        except Exception as e:
+            print(f"Error in catalog change listener {listener.__name__}: {str(e)}")
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_product_changes(session):
+    session.info.pop('product_changes', None)
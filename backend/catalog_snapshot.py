@@ -0,0 +1,315 @@
+# backend/catalog_snapshot.py
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from bisect import bisect_left, bisect_right
+
+from flask import current_app, has_app_context
+
+from catalog_events import on_product_change
+from change_log import latest_version
+from models import db, Product
+
+# Снимок каталога в файле, который все процессы-воркеры отображают в память (mmap)
+# только для чтения: страницы файла общие в page cache, и каталог не копируется
+# в каждый процесс. Формат (little-endian):
+#   заголовок HEADER, затем JSON с описанием разделов (meta),
+#   записи товаров фиксированного размера, отсортированные по id,
+#   массивы номеров записей (uint32) для каждой области — всего каталога и каждой категории —
+#   в порядке id и в порядке (цена, id), и закодированный JSON товаров во всех проекциях.
+# Файл заменяется целиком через os.replace, поэтому читатель видит либо старый, либо
+# новый снимок. На Windows отображенный файл заменить нельзя — снимок рассчитан на
+# запуск нескольких воркеров под Linux.
+MAGIC = b'CSNP'
+FORMAT_VERSION = 1
+# магия, версия формата, резерв, версия каталога, число товаров, длина meta
+HEADER = struct.Struct('<4sHHQII')
+# id, цена, остаток, номер категории + 1 (0 — без категории), затем (смещение, длина) JSON на проекцию
+RECORD_PREFIX = '<idiI'
+INDEX = struct.Struct('<I')
+
+# Пересборкой одновременно занимается один процесс; блокировка старше этого считается брошенной
+LOCK_TIMEOUT = 120
+
+
+def _record_struct(projection_count):
+    return struct.Struct(RECORD_PREFIX + 'QI' * projection_count)
+
+
+class CatalogSnapshot:
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.file_id = (stat.st_ino, stat.st_mtime_ns)
+
+        magic, file_format, _, self.version, self.count, meta_length = HEADER.unpack_from(self._mm)
+        if magic != MAGIC or file_format != FORMAT_VERSION:
+            raise ValueError(f"Unsupported catalog snapshot format: {path}")
+        meta = json.loads(self._mm[HEADER.size:HEADER.size + meta_length])
+        base = HEADER.size + meta_length
+
+        self.projections = {name: index for index, name in enumerate(meta['projections'])}
+        self.categories = meta['categories']
+        self._record = _record_struct(len(self.projections))
+        self._records = base + meta['records']
+        self._data = base + meta['data']
+
+        # Массивы номеров записей читаются прямо из отображения, без копирования
+        view = memoryview(self._mm)
+        self._scopes = {
+            scope: tuple(view[base + offset:base + offset + INDEX.size * length].cast('I')
+                         for offset in (by_id, by_price))
+            for scope, (by_id, by_price, length) in meta['scopes'].items()
+        }
+
+    def record(self, index):
+        return self._record.unpack_from(self._mm, self._records + index * self._record.size)
+
+    def _id(self, index):
+        return self.record(index)[0]
+
+    def _price_key(self, index):
+        record = self.record(index)
+        return record[1], record[0]
+
+    def product_json(self, index, projection):
+        record = self.record(index)
+        position = 4 + 2 * self.projections[projection]
+        start = self._data + record[position]
+        return self._mm[start:start + record[position + 1]]
+
+    def find(self, product_id):
+        index = bisect_left(range(self.count), product_id, key=self._id)
+        if index < self.count and self._id(index) == product_id:
+            return index
+        return None
+
+    # Номера записей следующей страницы: до limit штук после after (значения ключей
+    # сортировки из курсора). Поддерживаются сортировки newest, price_asc и price_desc
+    def scan(self, category, min_price, max_price, sort, after, limit):
+        scope = self._scopes.get(category or '')
+        if scope is None:
+            return []
+        by_id, by_price = scope
+
+        if sort == 'newest':
+            end = bisect_left(by_id, after[0], key=self._id) if after else len(by_id)
+            result = []
+            for position in range(end - 1, -1, -1):
+                price = self.record(by_id[position])[1]
+                if (min_price is None or price >= min_price) and (max_price is None or price <= max_price):
+                    result.append(by_id[position])
+                    if len(result) == limit:
+                        break
+            return result
+
+        lower = (min_price, float('-inf')) if min_price is not None else None
+        upper = (max_price, float('inf')) if max_price is not None else None
+        if sort == 'price_asc':
+            if after and (lower is None or tuple(after) > lower):
+                lower = tuple(after)
+                start = bisect_right(by_price, lower, key=self._price_key)
+            else:
+                start = bisect_left(by_price, lower, key=self._price_key) if lower else 0
+            end = bisect_right(by_price, upper, key=self._price_key) if upper else len(by_price)
+            return [by_price[position] for position in range(start, min(end, start + limit))]
+
+        start = bisect_left(by_price, lower, key=self._price_key) if lower else 0
+        if after and (upper is None or tuple(after) < upper):
+            end = bisect_left(by_price, tuple(after), key=self._price_key)
+        else:
+            end = bisect_right(by_price, upper, key=self._price_key) if upper else len(by_price)
+        return [by_price[position] for position in range(end - 1, max(start, end - limit) - 1, -1)]
+
+
+def _read_version(path):
+    try:
+        with open(path, 'rb') as f:
+            return HEADER.unpack(f.read(HEADER.size))[3]
+    except (OSError, struct.error):
+        return None
+
+
+# Собирает снимок из БД и атомарно подменяет им файл path. projections — имя проекции
+# в кортеж полей (как PROJECTIONS в routes/products.py). Возвращает версию снимка
+def build_snapshot(path, projections):
+    # Версия — последнее изменение товаров в журнале. Берется до чтения товаров:
+    # снимок может оказаться новее своей версии, но не старше
+    version = latest_version(db.session.connection())
+
+    fields = list(dict.fromkeys(['id', 'price', 'stock', 'category'] +
+                                [field for projection in projections.values() for field in projection]))
+    rows = db.session.query(*[getattr(Product, field) for field in fields]).order_by(Product.id).all()
+    db.session.rollback()
+
+    dumps = current_app.json.dumps
+    categories = sorted({row.category for row in rows if row.category})
+    category_numbers = {category: number for number, category in enumerate(categories, start=1)}
+    record = _record_struct(len(projections))
+
+    records = bytearray()
+    data = bytearray()
+    for row in rows:
+        product = dict(zip(fields, row))
+        locations = []
+        for projection in projections.values():
+            encoded = dumps({field: product[field] for field in projection}).encode()
+            locations += [len(data), len(encoded)]
+            data += encoded
+        records += record.pack(row.id, row.price, row.stock, category_numbers.get(row.category, 0), *locations)
+
+    scopes = {'': list(range(len(rows)))}
+    for index, row in enumerate(rows):
+        if row.category:
+            scopes.setdefault(row.category, []).append(index)
+
+    arrays = bytearray()
+    scope_meta = {}
+    for scope, by_id in scopes.items():
+        by_price = sorted(by_id, key=lambda index: (rows[index].price, rows[index].id))
+        scope_meta[scope] = [len(records) + len(arrays), len(records) + len(arrays) + INDEX.size * len(by_id),
+                             len(by_id)]
+        arrays += struct.pack(f'<{len(by_id)}I', *by_id) + struct.pack(f'<{len(by_price)}I', *by_price)
+
+    meta = json.dumps({
+        'projections': list(projections),
+        'categories': categories,
+        'scopes': scope_meta,
+        'records': 0,
+        'data': len(records) + len(arrays),
+    }).encode()
+
+    directory = os.path.dirname(os.path.abspath(path))
+    with tempfile.NamedTemporaryFile(dir=directory, prefix='.catalog-snapshot-', delete=False) as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, 0, version, len(rows), len(meta)))
+        f.write(meta)
+        f.write(records)
+        f.write(arrays)
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+    # Снимок, собранный параллельно другим процессом, может оказаться новее
+    current = _read_version(path)
+    if current is not None and current > version:
+        os.unlink(f.name)
+        return current
+    os.replace(f.name, path)
+    return version
+
+
+def _acquire_lock(lock_path):
+    for _ in range(2):
+        try:
+            os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return True
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock_path) < LOCK_TIMEOUT:
+                    return False
+                os.unlink(lock_path)
+            except OSError:
+                return False
+    return False
+
+
+_lock = threading.Lock()
+_snapshot = None
+_projections = {}
+# Минимальная версия снимка, которую этот процесс может отдавать: растет после
+# изменений каталога в этом процессе и по периодической сверке с журналом изменений
+_required_version = 0
+_checked_at = 0.0
+_rebuilding = False
+_rebuild_again = False
+
+
+def init_catalog_snapshot(app, projections):
+    _projections.update(projections)
+
+
+def _rebuild(app):
+    global _rebuilding, _rebuild_again
+    path = app.config['CATALOG_SNAPSHOT_PATH']
+    lock_path = path + '.lock'
+    while True:
+        with app.app_context():
+            if _acquire_lock(lock_path):
+                try:
+                    version = build_snapshot(path, _projections)
+                    print(f"Catalog snapshot rebuilt: version {version}")
+                except Exception as e:
+                    print(f"Error rebuilding catalog snapshot: {str(e)}")
+                finally:
+                    os.unlink(lock_path)
+        with _lock:
+            if not _rebuild_again:
+                _rebuilding = False
+                return
+            _rebuild_again = False
+
+
+# repeat=True — пересборку, которая уже идет, нужно повторить: она могла прочитать
+# каталог до только что зафиксированных изменений
+def schedule_rebuild(repeat=False):
+    global _rebuilding, _rebuild_again
+    app = current_app._get_current_object()
+    with _lock:
+        if _rebuilding:
+            _rebuild_again = _rebuild_again or repeat
+            return
+        _rebuilding = True
+    threading.Thread(target=_rebuild, args=(app,), daemon=True).start()
+
+
+def _load(path):
+    global _snapshot
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    snapshot = _snapshot
+    if snapshot is None or snapshot.file_id != (stat.st_ino, stat.st_mtime_ns):
+        snapshot = _snapshot = CatalogSnapshot(path)
+    return snapshot
+
+
+# Актуальный снимок каталога или None: снимок выключен, еще не собран или отстает
+# от БД — тогда чтение идет из БД, а снимок пересобирается в фоне
+def get_catalog_snapshot():
+    global _required_version, _checked_at
+    path = current_app.config['CATALOG_SNAPSHOT_PATH']
+    if not path:
+        return None
+
+    try:
+        snapshot = _load(path)
+    except (OSError, ValueError) as e:
+        print(f"Error loading catalog snapshot: {str(e)}")
+        snapshot = None
+
+    now = time.monotonic()
+    if now - _checked_at >= current_app.config['CATALOG_SNAPSHOT_CHECK_INTERVAL']:
+        _checked_at = now
+        _required_version = max(_required_version, latest_version(db.session.connection()))
+
+    if snapshot is None or snapshot.version < _required_version:
+        schedule_rebuild()
+        return None
+    return snapshot
+
+
+@on_product_change
+def _invalidate_catalog_snapshot(changes):
+    global _required_version
+    if not has_app_context() or not current_app.config.get('CATALOG_SNAPSHOT_PATH'):
+        return
+    # Загруженный снимок собран до этого commit, поэтому до пересборки не отдается
+    snapshot = _snapshot
+    _required_version = max(_required_version, (snapshot.version if snapshot else 0) + 1)
+    schedule_rebuild(repeat=True)
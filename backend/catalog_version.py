@@ -0,0 +1,145 @@
+# backend/catalog_version.py
+import threading
+import time
+import uuid
+from functools import wraps
+
+from flask import current_app, make_response, request
+
+from catalog_events import on_product_change
+from change_log import forget_own_versions, is_own_version, load_changes, sync_horizon
+from models import db
+from response_format import negotiated_format
+
+# Версия каталога увеличивается после каждого commit, который изменил Product
+# (включая остатки при оформлении и отмене заказа). Счетчик живет в процессе,
+# поэтому в ETag добавляется идентификатор процесса: после перезапуска
+# или в другом процессе старые ETag просто не совпадут.
+#
+# Изменения, сделанные другими процессами (воркерами gunicorn, seed_db.py, add_products.py),
+# процесс догоняет по общему журналу product_change_log не реже раза
+# в CATALOG_VERSION_CHECK_INTERVAL секунд: версия увеличивается, а подписчики
+# on_remote_change сбрасывают свои кэши. Дольше этого интервала устаревший ETag не живет
+BOOT_ID = uuid.uuid4().hex[:8]
+# Сколько изменений журнала читается за одну догоняющую синхронизацию
+SYNC_BATCH = 1000
+
+_lock = threading.Lock()
+_version = 0
+# Версии отдельных товаров: сколько раз товар менялся (здесь или в другом процессе) с запуска
+_product_versions = {}
+
+_sync_lock = threading.Lock()
+# Версия журнала, до которой процесс догнал изменения (None — еще не читали), и когда
+_synced = None
+_synced_at = 0.0
+_remote_listeners = []
+
+
+# Подписчики на изменения из других процессов: получают множество id измененных товаров.
+# Старого и нового состояния товаров, как у on_product_change, здесь нет — актуальные
+# строки подписчик перечитывает сам (load_product_rows). Вызываются в контексте запроса
+def on_remote_change(fn):
+    _remote_listeners.append(fn)
+    return fn
+
+
+def current_version():
+    return _version
+
+
+def product_version(product_id):
+    return _product_versions.get(product_id, 0)
+
+
+def _bump_products(product_ids):
+    with _lock:
+        for product_id in product_ids:
+            _product_versions[product_id] = _product_versions.get(product_id, 0) + 1
+
+
+def bump_version():
+    global _version
+    with _lock:
+        _version += 1
+    return _version
+
+
+@on_product_change
+def _bump_on_product_change(changes):
+    _bump_products(change.product_id for change in changes)
+    bump_version()
+
+
+def sync_catalog_version():
+    global _synced, _synced_at
+    if time.monotonic() - _synced_at < current_app.config['CATALOG_VERSION_CHECK_INTERVAL']:
+        return
+    with _sync_lock:
+        if time.monotonic() - _synced_at < current_app.config['CATALOG_VERSION_CHECK_INTERVAL']:
+            return
+        if _synced is None:
+            # Все, что было записано до первого запроса, и так прочитается из БД
+            _synced = max(sync_horizon(db.session.connection()) - 1, 0)
+        else:
+            remote = set()
+            while True:
+                changes, version, has_more = load_changes(_synced, SYNC_BATCH)
+                remote.update(change.product_id for change in changes if not is_own_version(change.version))
+                _synced = version
+                if not has_more:
+                    break
+            forget_own_versions(_synced)
+            if remote:
+                _bump_products(remote)
+                # Версия растет после подписчиков: загрузка, начатая до обновления индексов,
+                # завершится уже при новой версии и в кэш не попадет
+                for listener in _remote_listeners:
+                    try:
+                        listener(remote)
+                    except Exception as e:
+                        print(f"Error in catalog remote change listener {listener.__name__}: {str(e)}")
+                bump_version()
+        _synced_at = time.monotonic()
+
+
+# Текущие строки товаров по id пачками (пачка — один запрос с IN): {id: {колонка: значение}}.
+# Товаров, которых нет в результате, в БД больше нет
+def load_product_rows(columns, product_ids, batch_size=SYNC_BATCH):
+    product_ids = sorted(product_ids)
+    rows = {}
+    for start in range(0, len(product_ids), batch_size):
+        batch = product_ids[start:start + batch_size]
+        rows.update((row.id, row._asdict()) for row in
+                    db.session.query(*columns).filter(columns[0].in_(batch)))
+    return rows
+
+
+def catalog_etag():
+    return f"{BOOT_ID}-{current_version()}"
+
+
+# Условный GET для публичных эндпоинтов каталога: версия читается до обращения к БД,
+# и при совпадении If-None-Match сразу отдается 304 без запроса и сериализации.
+# Колоночный формат — другое тело, поэтому и ETag у него свой
+def catalog_cached(fn):
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        sync_catalog_version()
+        etag = catalog_etag()
+        if negotiated_format() == 'columnar':
+            etag = f"{etag}-columnar"
+        if request.if_none_match.contains_weak(etag):
+            response = make_response('', 304)
+        else:
+            response = make_response(fn(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = (
+            f"public, max-age={current_app.config['CATALOG_MAX_AGE']}, "
+            f"stale-while-revalidate={current_app.config['CATALOG_STALE_WHILE_REVALIDATE']}"
+        )
+        return response
+    return wrapper
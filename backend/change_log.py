@@ -0,0 +1,135 @@
+# backend/change_log.py
+import threading
+from datetime import datetime
+
+from models import db, Product, ProductChangeLog
+from sqlalchemy import event, func, select, text
+from sqlalchemy.orm import Session
+from upsert import upsert
+
+# Версия изменения — номер транзакции, которая его записала: в PostgreSQL txid_current(),
+# в SQLite (писатель всегда один) — следующий номер после максимального в журнале.
+# Все товары, измененные одной транзакцией, получают одну версию.
+#
+# Номера транзакций выдаются в момент первой записи, а фиксируются транзакции в другом
+# порядке, поэтому изменения отдаются только до горизонта — версии, ниже которой
+# незафиксированных транзакций уже нет. Иначе клиент мог бы получить версию 11
+# и навсегда пропустить еще не зафиксированную 10.
+
+# Версии, которые записали транзакции этого процесса: их изменения уже разосланы
+# подписчикам catalog_events, и при догоняющей синхронизации по журналу их можно пропустить
+_own_versions = set()
+_own_lock = threading.Lock()
+
+
+def _next_version(connection):
+    if connection.dialect.name == 'postgresql':
+        return connection.execute(text('SELECT txid_current()')).scalar()
+    return (connection.execute(select(func.max(ProductChangeLog.version))).scalar() or 0) + 1
+
+
+def sync_horizon(connection):
+    if connection.dialect.name == 'postgresql':
+        return connection.execute(text('SELECT txid_snapshot_xmin(txid_current_snapshot())')).scalar()
+    return (connection.execute(select(func.max(ProductChangeLog.version))).scalar() or 0) + 1
+
+
+# Версия последнего изменения товаров ниже горизонта: меняется только при записи в каталог,
+# в отличие от самого горизонта, который в PostgreSQL растет с любой транзакцией кластера
+def latest_version(connection):
+    horizon = sync_horizon(connection)
+    return connection.execute(
+        select(func.max(ProductChangeLog.version)).where(ProductChangeLog.version < horizon)
+    ).scalar() or 0
+
+
+def _write_changes(connection, changed, version, changed_at):
+    upsert(connection, ProductChangeLog.__table__, [
+        {'product_id': product_id, 'version': version, 'deleted': deleted, 'changed_at': changed_at}
+        for product_id, deleted in sorted(changed.items())
+    ], keys=('product_id',), replace=('version', 'deleted', 'changed_at'))
+
+
+# Журнал пишется тем же соединением сразу после flush, то есть в той же транзакции,
+# что и сами изменения товаров (включая остатки при заказах и возвратах)
+@event.listens_for(Session, 'after_flush')
+def _log_product_changes(session, flush_context):
+    changed = {}
+    for obj in session.new:
+        if isinstance(obj, Product):
+            changed[obj.id] = False
+    for obj in session.dirty:
+        if isinstance(obj, Product) and session.is_modified(obj, include_collections=False):
+            changed[obj.id] = False
+    for obj in session.deleted:
+        if isinstance(obj, Product):
+            changed[obj.id] = True
+    if not changed:
+        return
+
+    connection = session.connection()
+    version = _next_version(connection)
+    _write_changes(connection, changed, version, datetime.utcnow())
+    session.info.setdefault('change_log_versions', set()).add(version)
+
+
+@event.listens_for(Session, 'after_commit')
+def _remember_own_versions(session):
+    versions = session.info.pop('change_log_versions', None)
+    if versions:
+        with _own_lock:
+            _own_versions.update(versions)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_own_versions(session):
+    session.info.pop('change_log_versions', None)
+
+
+def is_own_version(version):
+    return version in _own_versions
+
+
+# Версии до upto включительно больше не понадобятся: синхронизация ушла дальше
+def forget_own_versions(upto):
+    with _own_lock:
+        _own_versions.difference_update([version for version in _own_versions if version <= upto])
+
+
+# Полная сверка журнала с таблицей товаров: после массовых операций в обход ORM
+# (seed_db.py, add_products.py) и при первом запуске на существующем каталоге.
+# Все товары считаются измененными, пропавшие из таблицы — удаленными
+def rebuild_change_log():
+    connection = db.session.connection()
+    version = _next_version(connection)
+
+    product_ids = {id for id, in db.session.query(Product.id)}
+    logged_ids = {id for id, in db.session.query(ProductChangeLog.product_id).filter(ProductChangeLog.deleted.is_(False))}
+    _write_changes(connection, {product_id: product_id not in product_ids for product_id in product_ids | logged_ids},
+                   version, datetime.utcnow())
+    db.session.commit()
+
+
+def ensure_change_log():
+    if db.session.query(ProductChangeLog.product_id).first() is None:
+        rebuild_change_log()
+
+
+# Изменения после версии since, не больше limit (кроме случая, когда одна транзакция
+# изменила больше limit товаров — она отдается целиком). Возвращает
+# (строки журнала, версия для следующего запроса, есть ли еще изменения)
+def load_changes(since, limit):
+    horizon = sync_horizon(db.session.connection())
+    rows = (ProductChangeLog.query
+            .filter(ProductChangeLog.version > since, ProductChangeLog.version < horizon)
+            .order_by(ProductChangeLog.version, ProductChangeLog.product_id)
+            .limit(limit + 1).all())
+    if len(rows) <= limit:
+        return rows, max(since, horizon - 1), False
+
+    # Версию, на которой оборвалась страница, целиком переносим на следующий запрос
+    boundary = rows[limit].version
+    rows = [row for row in rows[:limit] if row.version != boundary]
+    if not rows:
+        rows = ProductChangeLog.query.filter_by(version=boundary).order_by(ProductChangeLog.product_id).all()
+    return rows, rows[-1].version, True
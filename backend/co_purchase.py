@@ -0,0 +1,155 @@
+# backend/co_purchase.py
+from itertools import combinations
+
+from models import db, Order, OrderItem, Product, ProductCoPurchase
+from popularity import CANCELLED
+from sqlalchemy import delete, event, inspect
+from sqlalchemy.orm import Session
+from upsert import upsert
+
+# Из заказа учитываются только первые MAX_ORDER_PRODUCTS разных товаров (в порядке позиций):
+# пар в больших заказах квадратично много, а сигнала "купили вместе" почти нет
+# (оптовые и служебные заказы). Правило одно для новых заказов, отмен и полного пересчета.
+# Отмененные заказы не учитываются: отмена вычитает пары заказа, возврат из отмены — прибавляет
+MAX_ORDER_PRODUCTS = 50
+# Сколько пар накапливается в памяти при полном пересчете, прежде чем сбрасываются в БД
+PAIR_BUFFER = 200_000
+
+
+def _pair_key(product_id, related_id):
+    # Пара упакована в одно int: словарь int -> int заметно компактнее словаря кортежей
+    return product_id << 32 | related_id
+
+
+# Товары позиций заказа (в порядке позиций), которые участвуют в парах
+def _counted_products(product_ids):
+    counted = []
+    for product_id in product_ids:
+        if len(counted) == MAX_ORDER_PRODUCTS:
+            break
+        if product_id not in counted:
+            counted.append(product_id)
+    return counted
+
+
+def _count_order(pairs, product_ids, sign=1):
+    for first, second in combinations(_counted_products(product_ids), 2):
+        _count_pair(pairs, first, second, sign)
+
+
+def _count_pair(pairs, first, second, sign=1):
+    for key in (_pair_key(first, second), _pair_key(second, first)):
+        pairs[key] = pairs.get(key, 0) + sign
+
+
+def _write_pairs(connection, pairs):
+    upsert(connection, ProductCoPurchase.__table__, [
+        {'product_id': key >> 32, 'related_id': key & 0xFFFFFFFF, 'order_count': count}
+        for key, count in sorted(pairs.items())
+    ], keys=('product_id', 'related_id'), increment=('order_count',))
+
+
+# Отмена заказа и возврат из отмены видны только до flush, по истории статуса:
+# товары таких заказов собираются здесь, а пары вычитаются и прибавляются после flush
+@event.listens_for(Session, 'before_flush')
+def _collect_cancelled_orders(session, flush_context, instances):
+    cancelled = session.info.setdefault('co_purchase_cancelled', [])
+    with session.no_autoflush:
+        for obj in session.dirty:
+            if not isinstance(obj, Order) or obj in session.deleted:
+                continue
+            history = inspect(obj).attrs.status.history
+            if not history.deleted:
+                continue
+            was_cancelled, is_cancelled = history.deleted[0] == CANCELLED, obj.status == CANCELLED
+            if was_cancelled != is_cancelled:
+                product_ids = [item.product_id for item in sorted(obj.items, key=lambda item: item.id)]
+                cancelled.append((product_ids, -1 if is_cancelled else 1))
+
+
+# Новые заказы учитываются в той же транзакции, в которой создаются их позиции.
+# create_order сбрасывает позиции по одной (autoflush при чтении товара), поэтому
+# товары заказа, уже учтенные в этой транзакции, запоминаются в session.info,
+# и каждая новая позиция образует пары с ними. Позиции добавляются только при создании заказа
+@event.listens_for(Session, 'after_flush')
+def _count_new_orders(session, flush_context):
+    pairs = {}
+    for product_ids, sign in session.info.pop('co_purchase_cancelled', ()):
+        _count_order(pairs, product_ids, sign)
+
+    # id позиций выданы при flush: порядок тот же, что у полного пересчета
+    items = sorted((obj for obj in session.new if isinstance(obj, OrderItem)), key=lambda item: item.id)
+    if items:
+        orders = session.info.setdefault('co_purchase_orders', {})
+        for item in items:
+            counted = orders.setdefault(item.order_id, [])
+            if item.product_id not in counted and len(counted) < MAX_ORDER_PRODUCTS:
+                for other in counted:
+                    _count_pair(pairs, item.product_id, other)
+                counted.append(item.product_id)
+
+    connection = session.connection()
+    _write_pairs(connection, pairs)
+    # Пары, которые после отмены больше ни в одном заказе не встречаются
+    decreased = {key >> 32 for key, count in pairs.items() if count < 0}
+    if decreased:
+        table = ProductCoPurchase.__table__
+        connection.execute(delete(table).where(table.c.product_id.in_(decreased), table.c.order_count <= 0))
+
+
+@event.listens_for(Session, 'after_commit')
+@event.listens_for(Session, 'after_rollback')
+def _forget_new_orders(session):
+    session.info.pop('co_purchase_orders', None)
+    session.info.pop('co_purchase_cancelled', None)
+
+
+# Полный пересчет одним потоковым проходом по order_item неотмененных заказов,
+# упорядоченным по order_id и позиции:
+# в памяти держатся позиции одного заказа и буфер пар до PAIR_BUFFER, который
+# сбрасывается в таблицу прибавками. Таблица заменяется в одной транзакции,
+# так что читатели до commit видят прежние данные
+def rebuild_co_purchase(batch_size=1000):
+    db.session.execute(delete(ProductCoPurchase.__table__))
+
+    rows = (db.session.query(OrderItem.order_id, OrderItem.product_id)
+            .join(Order, Order.id == OrderItem.order_id)
+            .filter(Order.status != CANCELLED)
+            .order_by(OrderItem.order_id, OrderItem.id)
+            .yield_per(batch_size))
+    connection = db.session.connection()
+    pairs = {}
+    order_id, product_ids = None, []
+    orders = 0
+    for row_order_id, product_id in rows:
+        if row_order_id != order_id:
+            _count_order(pairs, product_ids)
+            order_id, product_ids = row_order_id, []
+            orders += 1
+            if len(pairs) >= PAIR_BUFFER:
+                _write_pairs(connection, pairs)
+                pairs = {}
+        product_ids.append(product_id)
+    _count_order(pairs, product_ids)
+    _write_pairs(connection, pairs)
+
+    db.session.commit()
+    return orders
+
+
+def ensure_co_purchase():
+    if (db.session.query(ProductCoPurchase.product_id).first() is None
+            and db.session.query(OrderItem.id).first() is not None):
+        rebuild_co_purchase()
+
+
+# Товары, которые чаще всего покупали вместе с product_id: один запрос по индексу
+# ix_product_co_purchase_top (обратным проходом) плюс первичный ключ product.
+# Возвращает строки с колонками columns
+def load_related(product_id, columns, limit):
+    return (db.session.query(*columns)
+            .join(ProductCoPurchase, ProductCoPurchase.related_id == Product.id)
+            .filter(ProductCoPurchase.product_id == product_id)
+            .order_by(ProductCoPurchase.order_count.desc(), ProductCoPurchase.related_id.desc())
+            .limit(limit)
+            .all())
@@ -0,0 +1,79 @@
+# backend/compression.py
+import zlib
+
+from flask import request
+
+from catalog_cache import LRUCache
+from response_format import negotiated_format
+
+COMPRESSIBLE_MIMETYPES = ('application/json', 'text/html', 'text/plain', 'text/css', 'application/javascript')
+
+# Сжатые тела ответов с ETag по (путь с параметрами, ETag, уровень сжатия, формат): одинаковый
+# ETag каталога означает одинаковое тело, и повторно сжимать его не нужно. Для ответов
+# с Vary: Accept тело зависит еще и от формата, выбранного заголовком Accept
+gzip_cache = LRUCache('gzip', maxsize=256, ttl=300)
+
+
+def _gzip(data, level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _gzip_stream(app_iter, chunks, level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    try:
+        for chunk in chunks:
+            data = compressor.compress(chunk)
+            # Без Z_SYNC_FLUSH маленькие куски копились бы в компрессоре до конца выдачи
+            data += compressor.flush(zlib.Z_SYNC_FLUSH)
+            if data:
+                yield data
+        yield compressor.flush()
+    finally:
+        if hasattr(app_iter, 'close'):
+            app_iter.close()
+
+
+def init_compression(app):
+    gzip_cache.configure(app.config['COMPRESS_CACHE_SIZE'], app.config['CATALOG_CACHE_TTL'])
+
+    @app.after_request
+    def compress_response(response):
+        if response.mimetype not in COMPRESSIBLE_MIMETYPES:
+            return response
+        # Ответ зависит от Accept-Encoding даже тогда, когда этому клиенту отдается несжатым
+        response.vary.add('Accept-Encoding')
+
+        if (not 200 <= response.status_code < 300 or response.status_code in (204, 206)
+                or response.direct_passthrough or 'Content-Encoding' in response.headers
+                or request.method == 'HEAD' or request.accept_encodings.quality('gzip') <= 0):
+            return response
+
+        level = app.config['COMPRESS_LEVEL']
+
+        # Потоковый ответ сжимается по мере выдачи; длина заранее неизвестна
+        if response.is_streamed:
+            app_iter = response.response
+            response.response = _gzip_stream(app_iter, response.iter_encoded(), level)
+            response.headers.pop('Content-Length', None)
+            response.headers['Content-Encoding'] = 'gzip'
+            return response
+
+        data = response.get_data()
+        if len(data) < app.config['COMPRESS_MIN_SIZE']:
+            return response
+
+        etag = response.headers.get('ETag')
+        if etag:
+            response_format = negotiated_format() if 'Accept' in response.vary else None
+            key = (request.full_path, etag, level, response_format)
+            found, compressed = gzip_cache.get(key)
+            if not found:
+                compressed = _gzip(data, level)
+                gzip_cache.set(key, compressed)
+        else:
+            compressed = _gzip(data, level)
+
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = 'gzip'
+        return response
@@ -0,0 +1,174 @@
+# backend/facets.py
+from bisect import bisect_right
+
+from models import db, Product, ProductFacet
+from sqlalchemy import case, event, func, inspect
+from sqlalchemy.orm import Session
+from upsert import upsert
+
+# Нижние границы ценовых диапазонов (в тенге), последний диапазон открыт сверху
+PRICE_BUCKETS = [0, 50_000, 100_000, 250_000, 500_000, 1_000_000]
+
+FACET_COLUMNS = ('category', 'price', 'stock')
+
+
+def price_bucket(price):
+    return max(bisect_right(PRICE_BUCKETS, price or 0) - 1, 0)
+
+
+def bucket_range(bucket):
+    upper = PRICE_BUCKETS[bucket + 1] if bucket + 1 < len(PRICE_BUCKETS) else None
+    return PRICE_BUCKETS[bucket], upper
+
+
+def facet_key(category, price, stock):
+    return (category or '', price_bucket(price)), 1 if (stock or 0) > 0 else 0
+
+
+# Без active_history старое значение незагруженного атрибута не попадает в историю,
+# и при изменении товара нельзя понять, из какой ячейки его вычесть
+for _column in FACET_COLUMNS:
+    event.listen(getattr(Product, _column), 'set', lambda *args: None, active_history=True)
+
+
+def _old_value(state, key):
+    history = state.attrs[key].history
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    return getattr(state.obj(), key)
+
+
+def _add_delta(deltas, category, price, stock, sign):
+    key, in_stock = facet_key(category, price, stock)
+    count, stocked = deltas.get(key, (0, 0))
+    deltas[key] = (count + sign, stocked + sign * in_stock)
+
+
+# Дельты считаются до flush, пока доступна история атрибутов,
+# а записываются после него тем же соединением, то есть в той же транзакции
+@event.listens_for(Session, 'before_flush')
+def _collect_facet_deltas(session, flush_context, instances):
+    deltas = session.info.setdefault('facet_deltas', {})
+
+    for obj in session.new:
+        if isinstance(obj, Product):
+            _add_delta(deltas, obj.category, obj.price, obj.stock, 1)
+
+    for obj in session.deleted:
+        if isinstance(obj, Product):
+            _add_delta(deltas, obj.category, obj.price, obj.stock, -1)
+
+    for obj in session.dirty:
+        if not isinstance(obj, Product) or obj in session.deleted:
+            continue
+        state = inspect(obj)
+        if not any(state.attrs[key].history.has_changes() for key in FACET_COLUMNS):
+            continue
+        old = [_old_value(state, key) for key in FACET_COLUMNS]
+        _add_delta(deltas, *old, -1)
+        _add_delta(deltas, obj.category, obj.price, obj.stock, 1)
+
+
+@event.listens_for(Session, 'after_flush')
+def _apply_facet_deltas(session, flush_context):
+    deltas = session.info.pop('facet_deltas', None)
+    if not deltas:
+        return
+
+    upsert(session.connection(), ProductFacet.__table__, [
+        {'category': category, 'price_bucket': bucket, 'product_count': count, 'in_stock_count': stocked}
+        for (category, bucket), (count, stocked) in sorted(deltas.items()) if count or stocked
+    ], keys=('category', 'price_bucket'), increment=('product_count', 'in_stock_count'))
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_facet_deltas(session):
+    session.info.pop('facet_deltas', None)
+
+
+def _bucket_expression():
+    return case(
+        *[(Product.price >= lower, index) for index, lower in reversed(list(enumerate(PRICE_BUCKETS)))],
+        else_=0
+    )
+
+
+# Счетчики (категория, ценовой диапазон, товаров, в наличии) по товарам из query —
+# запроса по Product с уже примененными фильтрами
+def count_facets(query):
+    bucket = _bucket_expression()
+    return query.with_entities(
+        func.coalesce(Product.category, ''),
+        bucket,
+        func.count(Product.id),
+        func.sum(case((Product.stock > 0, 1), else_=0))
+    ).group_by(func.coalesce(Product.category, ''), bucket).all()
+
+
+# Полный пересчет: после массовых операций в обход ORM (seed_db.py, add_products.py)
+# и при первом запуске на существующем каталоге
+def rebuild_facets():
+    rows = count_facets(db.session.query(Product))
+
+    db.session.query(ProductFacet).delete()
+    db.session.add_all([
+        ProductFacet(category=category, price_bucket=price_bucket_index,
+                     product_count=count, in_stock_count=stocked or 0)
+        for category, price_bucket_index, count, stocked in rows
+    ])
+    db.session.commit()
+
+
+def ensure_facets():
+    if db.session.query(ProductFacet.category).first() is None:
+        rebuild_facets()
+
+
+def _bucket_overlaps(bucket, min_price, max_price):
+    lower, upper = bucket_range(bucket)
+    if min_price is not None and upper is not None and upper <= min_price:
+        return False
+    if max_price is not None and lower > max_price:
+        return False
+    return True
+
+
+# Фасеты для текущих фильтров одним запросом к маленькой таблице product_facet.
+# Как обычно для фильтров-сайдбаров, каждый фасет учитывает остальные фильтры,
+# но не свой собственный. Цена учитывается с точностью до диапазона.
+# Таблица не знает о поиске и характеристиках: при них счетчики передаются в rows —
+# count_facets по товарам, которые подходят под поиск и характеристики.
+# Возвращает (фасеты, список всех непустых категорий).
+def get_facets(categories=(), min_price=None, max_price=None, price_buckets=(), in_stock=False, rows=None):
+    table_rows = [(row.category, row.price_bucket, row.product_count, row.in_stock_count)
+                  for row in ProductFacet.query.filter(ProductFacet.product_count > 0)]
+    names = {category for category, _, _, _ in table_rows}
+    if rows is None:
+        rows = table_rows
+
+    category_counts = {}
+    buckets = {}
+    for category, bucket, product_count, in_stock_count in rows:
+        in_stock_count = in_stock_count or 0
+        count = in_stock_count if in_stock else product_count
+        if (_bucket_overlaps(bucket, min_price, max_price)
+                and (not price_buckets or bucket in price_buckets)):
+            total, stocked = category_counts.get(category, (0, 0))
+            category_counts[category] = (total + count, stocked + in_stock_count)
+        if not categories or category in categories:
+            total, stocked = buckets.get(bucket, (0, 0))
+            buckets[bucket] = (total + count, stocked + in_stock_count)
+
+    facets = {
+        'categories': [
+            {'name': name, 'count': count, 'in_stock': stocked}
+            for name, (count, stocked) in sorted(category_counts.items()) if name and count
+        ],
+        'price_buckets': [
+            {'min': bucket_range(bucket)[0], 'max': bucket_range(bucket)[1], 'count': count, 'in_stock': stocked}
+            for bucket, (count, stocked) in sorted(buckets.items()) if count
+        ],
+    }
+    return facets, sorted(name for name in names if name)
@@ -0,0 +1,284 @@
+# backend/filter_engine.py
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+
+from flask import current_app
+
+from catalog_events import on_product_change
+from change_log import load_changes, sync_horizon
+from facets import PRICE_BUCKETS, bucket_range, price_bucket
+from models import db, Product
+
+ENGINE_COLUMNS = (Product.id, Product.category, Product.price, Product.stock)
+# Сколько изменений журнала применяется за одну догоняющую синхронизацию
+SYNC_BATCH = 1000
+
+
+def bitmap(ids, size):
+    bits = bytearray((size >> 3) + 1)
+    for id in ids:
+        bits[id >> 3] |= 1 << (id & 7)
+    return int.from_bytes(bits, 'little')
+
+
+def bit_positions(mask):
+    # Все установленные биты по возрастанию за один проход по байтам карты
+    positions = []
+    for index, byte in enumerate(mask.to_bytes((mask.bit_length() + 7) >> 3, 'little')):
+        base = index << 3
+        while byte:
+            low = byte & -byte
+            positions.append(base + low.bit_length() - 1)
+            byte ^= low
+    return positions
+
+
+def iter_bits(mask):
+    # Номера установленных битов по убыванию
+    while mask:
+        bit = mask.bit_length() - 1
+        yield bit
+        mask ^= 1 << bit
+
+
+class FilterEngine:
+    # Фильтры каталога на битовых картах: бит с номером id товара установлен, если товар
+    # подходит под условие. Карты — обычные int Python, пересечение и подсчет (&, bit_count)
+    # выполняются в C над всем каталогом сразу. Есть карты по категориям, по ценовым
+    # диапазонам facets.PRICE_BUCKETS и по наличию; точные границы цены берутся из списка
+    # (цена, id), отсортированного по цене.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.built = False
+        # Версия журнала изменений (change_log.py), до которой индекс догнан
+        self.version = 0
+        self.synced_at = 0.0
+        self._products = {}
+        self._all = 0
+        self._in_stock = 0
+        self._categories = {}
+        self._buckets = {}
+        self._by_price = []
+
+    def build(self, rows, version):
+        products = {row.id: (row.category or '', row.price, row.stock) for row in rows}
+        size = max(products, default=0)
+
+        categories = {}
+        buckets = {}
+        for id, (category, price, _) in products.items():
+            categories.setdefault(category, []).append(id)
+            buckets.setdefault(price_bucket(price), []).append(id)
+
+        with self._lock:
+            self._products = products
+            self._all = bitmap(products, size)
+            self._in_stock = bitmap((id for id, (_, _, stock) in products.items() if stock > 0), size)
+            self._categories = {category: bitmap(ids, size) for category, ids in categories.items()}
+            self._buckets = {bucket: bitmap(ids, size) for bucket, ids in buckets.items()}
+            self._by_price = sorted((price, id) for id, (_, price, _) in products.items())
+            self.version = version
+            self.synced_at = time.monotonic()
+            self.built = True
+
+    def _remove(self, id):
+        product = self._products.pop(id, None)
+        if product is None:
+            return
+        category, price, _ = product
+        bit = 1 << id
+        self._all &= ~bit
+        self._in_stock &= ~bit
+        self._categories[category] &= ~bit
+        self._buckets[price_bucket(price)] &= ~bit
+        del self._by_price[bisect_left(self._by_price, (price, id))]
+
+    def upsert(self, id, category, price, stock):
+        category = category or ''
+        with self._lock:
+            self._remove(id)
+            self._products[id] = (category, price, stock)
+            bit = 1 << id
+            self._all |= bit
+            if stock > 0:
+                self._in_stock |= bit
+            self._categories[category] = self._categories.get(category, 0) | bit
+            bucket = price_bucket(price)
+            self._buckets[bucket] = self._buckets.get(bucket, 0) | bit
+            insort(self._by_price, (price, id))
+
+    def remove(self, id):
+        with self._lock:
+            self._remove(id)
+
+    def _price_range(self, min_price, max_price):
+        lo = bisect_left(self._by_price, (min_price, -1)) if min_price is not None else 0
+        hi = bisect_right(self._by_price, (max_price, float('inf'))) if max_price is not None else len(self._by_price)
+
+        # Диапазоны, целиком попавшие в [min_price, max_price], берутся готовыми картами,
+        # по одному товару собираются только края
+        full = [bucket for bucket in range(len(PRICE_BUCKETS))
+                if (min_price is None or bucket_range(bucket)[0] >= min_price)
+                and (max_price is None or (bucket_range(bucket)[1] is not None and bucket_range(bucket)[1] <= max_price))]
+        if not full:
+            return bitmap((id for _, id in self._by_price[lo:hi]), self._all.bit_length())
+
+        first, last = bucket_range(full[0])[0], bucket_range(full[-1])[1]
+        full_lo = bisect_left(self._by_price, (first, -1))
+        full_hi = bisect_left(self._by_price, (last, -1)) if last is not None else hi
+        edges = [id for _, id in self._by_price[lo:full_lo]] + [id for _, id in self._by_price[full_hi:hi]]
+        mask = bitmap(edges, self._all.bit_length())
+        for bucket in full:
+            mask |= self._buckets.get(bucket, 0)
+        return mask
+
+    # Одним проходом: id товаров страницы (до limit) и фасеты в формате facets.get_facets.
+    # Как и там, каждый фасет учитывает остальные фильтры, но не свой собственный
+    def query(self, categories, price_buckets, min_price, max_price, in_stock, sort, after, limit):
+        with self._lock:
+            category_mask = self._all
+            if categories:
+                category_mask = 0
+                for category in categories:
+                    category_mask |= self._categories.get(category, 0)
+
+            price_mask = self._all
+            if price_buckets:
+                price_mask = 0
+                for bucket in price_buckets:
+                    price_mask |= self._buckets.get(bucket, 0)
+            if min_price is not None or max_price is not None:
+                price_mask &= self._price_range(min_price, max_price)
+
+            stock_mask = self._in_stock if in_stock else self._all
+            result = category_mask & price_mask & stock_mask
+
+            # Границы цены, за которыми подходящих товаров точно нет: ими сужается проход по цене
+            low, high = min_price, max_price
+            if price_buckets:
+                bucket_low = bucket_range(min(price_buckets))[0]
+                bucket_high = bucket_range(max(price_buckets))[1]
+                low = bucket_low if low is None else max(low, bucket_low)
+                if bucket_high is not None:
+                    high = bucket_high if high is None else min(high, bucket_high)
+
+            ids = self._page(result, sort, after, limit, low, high)
+            facets = {
+                'categories': [
+                    {'name': category,
+                     'count': (mask & price_mask & stock_mask).bit_count(),
+                     'in_stock': (mask & price_mask & self._in_stock).bit_count()}
+                    for category, mask in sorted(self._categories.items()) if category
+                ],
+                'price_buckets': [
+                    {'min': bucket_range(bucket)[0], 'max': bucket_range(bucket)[1],
+                     'count': (mask & category_mask & stock_mask).bit_count(),
+                     'in_stock': (mask & category_mask & self._in_stock).bit_count()}
+                    for bucket, mask in sorted(self._buckets.items())
+                ],
+            }
+            facets['categories'] = [facet for facet in facets['categories'] if facet['count']]
+            facets['price_buckets'] = [facet for facet in facets['price_buckets'] if facet['count']]
+            names = sorted(category for category, mask in self._categories.items() if category and mask)
+            return ids, facets, names
+
+    def _page(self, result, sort, after, limit, low=None, high=None):
+        if sort == 'newest':
+            if after:
+                result &= (1 << max(min(after[0], result.bit_length()), 0)) - 1
+            ids = []
+            for id in iter_bits(result):
+                ids.append(id)
+                if len(ids) == limit:
+                    break
+            return ids
+
+        # По цене: если подходящих товаров мало, сортируем только их, иначе идем
+        # по общему списку (цена, id) и проверяем бит в байтовом представлении карты.
+        # Выбирается вариант с меньшей оценкой числа шагов
+        matched = result.bit_count()
+        if not matched:
+            return []
+        lo = bisect_left(self._by_price, (low, -1)) if low is not None else 0
+        hi = bisect_right(self._by_price, (high, float('inf'))) if high is not None else len(self._by_price)
+        window = hi - lo
+        if len(self._by_price) // 8 + matched < limit * window // matched:
+            order = sorted((self._products[id][1], id) for id in bit_positions(result))
+            lo, hi = 0, len(order)
+            is_match = None
+        else:
+            order = self._by_price
+            bits = result.to_bytes((result.bit_length() >> 3) + 1, 'little')
+            is_match = lambda id: id >> 3 < len(bits) and bits[id >> 3] >> (id & 7) & 1
+
+        ids = []
+        if sort == 'price_asc':
+            start = max(bisect_right(order, tuple(after)), lo) if after else lo
+            positions = range(start, hi)
+        else:
+            end = min(bisect_left(order, tuple(after)), hi) if after else hi
+            positions = range(end - 1, lo - 1, -1)
+        for position in positions:
+            id = order[position][1]
+            if is_match is None or is_match(id):
+                ids.append(id)
+                if len(ids) == limit:
+                    break
+        return ids
+
+    def stats(self):
+        with self._lock:
+            return {'products': len(self._products), 'version': self.version, 'categories': len(self._categories)}
+
+
+filter_engine = FilterEngine()
+_build_lock = threading.Lock()
+
+
+def _sync(engine):
+    # Изменения из других процессов догоняются по журналу изменений
+    while True:
+        changes, version, has_more = load_changes(engine.version, SYNC_BATCH)
+        updated = [change.product_id for change in changes if not change.deleted]
+        rows = {row.id: row for row in db.session.query(*ENGINE_COLUMNS).filter(Product.id.in_(updated))} \
+            if updated else {}
+        for change in changes:
+            row = rows.get(change.product_id)
+            if row is None:
+                engine.remove(change.product_id)
+            else:
+                engine.upsert(row.id, row.category, row.price, row.stock)
+        engine.version = version
+        if not has_more:
+            break
+    engine.synced_at = time.monotonic()
+
+
+def get_filter_engine():
+    # Строится один раз на процесс, дальше поддерживается событиями каталога этого процесса
+    # и не реже раза в CATALOG_FILTER_ENGINE_SYNC секунд догоняет журнал изменений
+    if not filter_engine.built:
+        with _build_lock:
+            if not filter_engine.built:
+                # Версия берется до чтения товаров: изменения между ними применятся повторно, это безопасно
+                version = max(sync_horizon(db.session.connection()) - 1, 0)
+                filter_engine.build(db.session.query(*ENGINE_COLUMNS).yield_per(1000), version)
+    elif time.monotonic() - filter_engine.synced_at >= current_app.config['CATALOG_FILTER_ENGINE_SYNC']:
+        with _build_lock:
+            if time.monotonic() - filter_engine.synced_at >= current_app.config['CATALOG_FILTER_ENGINE_SYNC']:
+                _sync(filter_engine)
+    return filter_engine
+
+
+@on_product_change
+def _update_filter_engine(changes):
+    if not filter_engine.built:
+        return
+    for change in changes:
+        if change.op == 'delete':
+            filter_engine.remove(change.product_id)
+        else:
+            data = change.data
+            filter_engine.upsert(change.product_id, data['category'], data['price'], data['stock'])
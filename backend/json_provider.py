@@ -0,0 +1,70 @@
+# backend/json_provider.py
+import json
+
+from flask import current_app
+from flask.json.provider import DefaultJSONProvider
+
+from catalog_cache import fragment_cache
+from catalog_version import current_version, product_version
+
+
+class Fragment:
+    # Уже закодированный JSON, который вставляется в ответ как есть
+    __slots__ = ('json',)
+
+    def __init__(self, json):
+        self.json = json
+
+
+def _has_fragments(value):
+    if isinstance(value, Fragment):
+        return True
+    return isinstance(value, list) and any(isinstance(item, Fragment) for item in value)
+
+
+class CatalogJSONProvider(DefaultJSONProvider):
+    # Ключи не сортируются и пробелы не добавляются: ответы каталога большие,
+    # а порядок ключей клиенту не важен
+    sort_keys = False
+    compact = True
+
+    def dumps(self, obj, **kwargs):
+        kwargs.setdefault('default', self.default)
+        kwargs.setdefault('ensure_ascii', self.ensure_ascii)
+        kwargs.setdefault('sort_keys', self.sort_keys)
+        kwargs.setdefault('separators', (',', ':'))
+
+        # Фрагменты допускаются на верхнем уровне: значением словаря, в списке
+        # или в списке-значении словаря. Все остальное кодирует json.dumps целиком
+        if isinstance(obj, dict) and any(_has_fragments(value) for value in obj.values()):
+            items = [f"{json.dumps(key, **kwargs)}:{self._dumps_value(value, kwargs)}" for key, value in obj.items()]
+            return '{' + ','.join(items) + '}'
+        if _has_fragments(obj):
+            return self._dumps_value(obj, kwargs)
+        return json.dumps(obj, **kwargs)
+
+    def _dumps_value(self, value, kwargs):
+        if isinstance(value, Fragment):
+            return value.json
+        if _has_fragments(value):
+            return '[' + ','.join(self._dumps_value(item, kwargs) for item in value) + ']'
+        return json.dumps(value, **kwargs)
+
+
+# Строки выборки (первой колонкой идет id) в закодированные JSON-фрагменты. Фрагмент
+# кэшируется по набору полей, id и версии товара: изменение товара в этом процессе или
+# в другом (после синхронизации по журналу) делает старые записи недостижимыми.
+# version — версия каталога до выборки; если каталог менялся во время выборки, строка
+# могла быть прочитана до commit, и фрагменты не кэшируются
+def product_fragments(fields, rows, version):
+    cacheable = current_version() == version
+    fragments = []
+    for row in rows:
+        key = (fields, row[0], product_version(row[0]))
+        found, fragment = fragment_cache.get(key)
+        if not found:
+            fragment = Fragment(current_app.json.dumps(dict(zip(fields, row))))
+            if cacheable:
+                fragment_cache.set(key, fragment)
+        fragments.append(fragment)
+    return fragments
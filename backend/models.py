@@ -1,5 +1,6 @@
 # backend/models.py
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.dialects.postgresql import JSONB
 from datetime import datetime
 
 db = SQLAlchemy()
@@ -11,6 +12,8 @@ class User(db.Model):
     orders = db.relationship('Order', backref='user', lazy=True)
     returns = db.relationship('Return', backref='user', lazy=True)
     is_admin = db.Column(db.Boolean, default=False)
+    # Растет при смене роли: токены, выданные с меньшей версией, больше не принимаются (см. auth_claims.py)
+    token_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
 
 class Product(db.Model):
@@ -21,6 +24,70 @@ class Product(db.Model):
     stock = db.Column(db.Integer, nullable=False)
     category = db.Column(db.String(50))
     image_url = db.Column(db.String(200))
+    # Характеристики товара {ключ: значение} для фильтров каталога (см. specs.py):
+    # jsonb с GIN-индексом в PostgreSQL, JSON в SQLite
+    attributes = db.Column(db.JSON(none_as_null=True).with_variant(JSONB(none_as_null=True), 'postgresql'))
+
+    # Составные индексы под keyset-пагинацию каталога (сортировка + id как tie-breaker)
+    __table_args__ = (
+        db.Index('ix_product_price_id', 'price', 'id'),
+        db.Index('ix_product_name_id', 'name', 'id'),
+        db.Index('ix_product_category_price_id', 'category', 'price', 'id'),
+        db.Index('ix_product_category_name_id', 'category', 'name', 'id'),
+        db.Index('ix_product_category_id', 'category', 'id'),
+    )
+
+class ProductFacet(db.Model):
+    # Счетчики для фильтров каталога по (категория, ценовой диапазон),
+    # обновляются вместе с изменениями Product (см. facets.py)
+    category = db.Column(db.String(50), primary_key=True)  # '' для товаров без категории
+    price_bucket = db.Column(db.Integer, primary_key=True)
+    product_count = db.Column(db.Integer, nullable=False, default=0)
+    in_stock_count = db.Column(db.Integer, nullable=False, default=0)
+
+class ProductChangeLog(db.Model):
+    # Последнее изменение каждого товара для дельта-синхронизации каталога (см. change_log.py).
+    # Строка на товар; после удаления товара остается с deleted=True
+    product_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    version = db.Column(db.BigInteger, nullable=False, index=True)
+    deleted = db.Column(db.Boolean, nullable=False, default=False)
+    changed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class ProductPopularity(db.Model):
+    # Популярность товара для sort=popular (см. popularity.py): сумма проданных штук,
+    # каждая с весом, растущим со временем продажи. Строка есть у каждого товара
+    product_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    score = db.Column(db.Float, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    # Под keyset-пагинацию: сортировка по score, product_id как tie-breaker
+    __table_args__ = (
+        db.Index('ix_product_popularity_score_id', 'score', 'product_id'),
+    )
+
+class PopularityEpoch(db.Model):
+    # Точка отсчета весов продаж в product_popularity (см. popularity.py). Одна строка с id=1,
+    # переносится вперед вместе с пересчетом всех score
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    epoch = db.Column(db.DateTime, nullable=False)
+
+class ProductCoPurchase(db.Model):
+    # Сколько заказов содержали оба товара (см. co_purchase.py). Хранится в обе стороны,
+    # чтобы "с этим товаром покупают" читалось одним запросом по product_id
+    product_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    related_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.Index('ix_product_co_purchase_top', 'product_id', 'order_count', 'related_id'),
+    )
+
+class ProductStats(db.Model):
+    # Накопленные просмотры карточки товара (см. view_counter.py). Отдельная таблица
+    # без внешнего ключа: запись счетчиков не берет никаких блокировок на строки product
+    product_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    view_count = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
 
 class Cart(db.Model):
     id = db.Column(db.Integer, primary_key=True)
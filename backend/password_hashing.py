@@ -0,0 +1,129 @@
+# backend/password_hashing.py
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# Хэширование паролей (pbkdf2) выполняется в ограниченном пуле потоков: hashlib отпускает
+# GIL на время pbkdf2, так что пул держит занятыми не больше PASSWORD_HASH_WORKERS ядер,
+# а всплеск входов не занимает все воркеры на долгие секунды. Ожидающих задач не больше
+# PASSWORD_HASH_QUEUE — сверх этого запрос сразу получает отказ (503), а не ждет в очереди
+LATENCY_SAMPLES = 1000
+
+
+class HashQueueFull(Exception):
+    pass
+
+
+class PasswordHasher:
+    def __init__(self, method='pbkdf2:sha256:1000000', workers=2, queue_size=32):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._slots = None
+        self.configure(method, workers, queue_size)
+
+    def configure(self, method, workers, queue_size):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+            self.method = method
+            self.workers = workers
+            self.queue_size = queue_size
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+            # Места и в работе, и в очереди: больше workers + queue_size задач не принимается
+            self._slots = threading.BoundedSemaphore(workers + queue_size)
+            self._pending = 0
+            # Метрики относятся к текущим параметрам и начинаются заново
+            self._latencies = {'hash': deque(maxlen=LATENCY_SAMPLES), 'verify': deque(maxlen=LATENCY_SAMPLES)}
+            self._counters = dict.fromkeys(('hashed', 'verified', 'rehashed', 'rejected'), 0)
+
+    def _run(self, operation, fn, *args):
+        slots = self._slots
+        if not slots.acquire(blocking=False):
+            with self._lock:
+                self._counters['rejected'] += 1
+            raise HashQueueFull('Too many password operations in progress, try again later')
+
+        def timed():
+            started = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                elapsed = time.perf_counter() - started
+                with self._lock:
+                    self._latencies[operation].append(elapsed)
+
+        with self._lock:
+            self._pending += 1
+        try:
+            return self._executor.submit(timed).result()
+        finally:
+            with self._lock:
+                self._pending -= 1
+            slots.release()
+
+    def hash(self, password):
+        value = self._run('hash', generate_password_hash, password, self.method)
+        with self._lock:
+            self._counters['hashed'] += 1
+        return value
+
+    def verify(self, password_hash, password):
+        result = self._run('verify', check_password_hash, password_hash, password)
+        with self._lock:
+            self._counters['verified'] += 1
+        return result
+
+    # Хэш сделан с другими параметрами (метод, функция, число итераций), чем текущие
+    def needs_rehash(self, password_hash):
+        return password_hash.split('$', 1)[0] != self.method
+
+    def record_rehash(self):
+        with self._lock:
+            self._counters['rehashed'] += 1
+
+    def stats(self):
+        with self._lock:
+            latencies = {}
+            for operation, samples in self._latencies.items():
+                ordered = sorted(samples)
+                latencies[operation] = {
+                    'samples': len(ordered),
+                    'avg_ms': round(sum(ordered) / len(ordered) * 1000, 2) if ordered else None,
+                    'p50_ms': round(ordered[len(ordered) // 2] * 1000, 2) if ordered else None,
+                    'p95_ms': round(ordered[int(len(ordered) * 0.95)] * 1000, 2) if ordered else None,
+                    'max_ms': round(ordered[-1] * 1000, 2) if ordered else None,
+                }
+            return {
+                'method': self.method,
+                'workers': self.workers,
+                'queue_size': self.queue_size,
+                'pending': self._pending,
+                **self._counters,
+                'latency': latencies,
+            }
+
+
+password_hasher = PasswordHasher()
+
+
+def init_password_hashing(app):
+    password_hasher.configure(app.config['PASSWORD_HASH_METHOD'], app.config['PASSWORD_HASH_WORKERS'],
+                              app.config['PASSWORD_HASH_QUEUE'])
+
+
+def hash_password(password):
+    return password_hasher.hash(password)
+
+
+# Проверяет пароль; если хэш сделан с устаревшими параметрами, а пароль верен,
+# заменяет хэш пользователя на новый (commit — за вызывающим)
+def verify_password(user, password):
+    if not password_hasher.verify(user.password, password):
+        return False
+    if password_hasher.needs_rehash(user.password):
+        user.password = password_hasher.hash(password)
+        password_hasher.record_rehash()
+    return True
@@ -0,0 +1,205 @@
+# backend/popularity.py
+from datetime import datetime
+
+from models import db, Order, OrderItem, PopularityEpoch, Product, ProductPopularity
+from sqlalchemy import delete, event, inspect, select, update
+from sqlalchemy.orm import Session
+from upsert import upsert
+
+# Популярность — число проданных штук с затуханием: продажа, сделанная на half_life дней
+# раньше, весит вдвое меньше. Чтобы не пересчитывать все строки каждый день, вес продажи
+# хранится "в будущих единицах": 2 ** (дней от точки отсчета / half_life). Новые продажи
+# весят больше старых, порядок товаров тот же, что у честно затухающего счетчика,
+# а обновление — просто прибавка к score. После смены half_life нужен rebuild_popularity()
+#
+# Точка отсчета хранится в popularity_epoch и периодически переносится вперед
+# (rebase_popularity, из recompute_popularity.py): все score умножаются на один множитель,
+# порядок не меняется, а веса остаются около единицы и не растут до переполнения float
+POPULARITY_EPOCH = datetime(2024, 1, 1)
+DEFAULT_HALF_LIFE_DAYS = 30
+# Предел показателя степени веса: если точку отсчета долго не переносили, новые продажи
+# перестают обгонять старые, но запись заказа не падает с OverflowError
+MAX_WEIGHT_EXPONENT = 1000.0
+EPOCH_ID = 1
+
+CANCELLED = 'cancelled'
+
+_settings = {'half_life_days': DEFAULT_HALF_LIFE_DAYS}
+
+# Без active_history прежний статус незагруженного заказа не попадает в историю,
+# и отмену заказа нельзя отличить от любого другого изменения
+event.listen(Order.status, 'set', lambda *args: None, active_history=True)
+
+
+def init_popularity(app):
+    half_life_days = app.config['POPULARITY_HALF_LIFE_DAYS']
+    if not half_life_days > 0:
+        raise ValueError(f"POPULARITY_HALF_LIFE_DAYS must be positive, got {half_life_days}")
+    _settings['half_life_days'] = half_life_days
+
+
+def sale_weight(sold_at, epoch):
+    days = (sold_at - epoch).total_seconds() / 86400
+    return 2 ** min(days / _settings['half_life_days'], MAX_WEIGHT_EXPONENT)
+
+
+# Текущая точка отсчета. lock=True — в транзакции, которая пишет score: перенос точки
+# отсчета ждет ее завершения, и прибавки не смешиваются со старым и новым масштабом
+def load_epoch(connection, lock=False):
+    query = select(PopularityEpoch.epoch).where(PopularityEpoch.id == EPOCH_ID)
+    if lock:
+        query = query.with_for_update(read=True)
+    # Без строки — score посчитаны от исходной точки отсчета
+    return connection.execute(query).scalar() or POPULARITY_EPOCH
+
+
+def _add(deltas, product_id, amount):
+    deltas[product_id] = deltas.get(product_id, 0) + amount
+
+
+def _order_items_sales(sales, order, sign):
+    sold_at = order.created_at or datetime.utcnow()
+    for item in order.items:
+        sales.append((item.product_id, sign * item.quantity, sold_at))
+
+
+# Как и фасеты: продажи собираются до flush, пока видна история статуса заказа,
+# а прибавки считаются и записываются после него тем же соединением, то есть в той же
+# транзакции, что и заказ
+@event.listens_for(Session, 'before_flush')
+def _collect_popularity_sales(session, flush_context, instances):
+    sales = session.info.setdefault('popularity_sales', [])
+
+    with session.no_autoflush:
+        # Вес продажи — по времени создания заказа, чтобы отмена вычла ровно то, что было прибавлено.
+        # Заказ обычно уже в сессии (create_order делает flush до позиций), get берет его без запроса
+        for obj in session.new:
+            if isinstance(obj, OrderItem):
+                order = obj.order or session.get(Order, obj.order_id)
+                if order is None or order.status != CANCELLED:
+                    sold_at = order.created_at if order is not None and order.created_at else datetime.utcnow()
+                    sales.append((obj.product_id, obj.quantity, sold_at))
+
+        for obj in session.deleted:
+            if isinstance(obj, OrderItem) and obj.order is not None and obj.order.status != CANCELLED:
+                sales.append((obj.product_id, -obj.quantity, obj.order.created_at))
+
+        # Отмена заказа вычитает его продажи с тем же весом, с которым они были добавлены
+        for obj in session.dirty:
+            if not isinstance(obj, Order) or obj in session.deleted:
+                continue
+            history = inspect(obj).attrs.status.history
+            if not history.deleted:
+                continue
+            was_cancelled, is_cancelled = history.deleted[0] == CANCELLED, obj.status == CANCELLED
+            if was_cancelled != is_cancelled:
+                _order_items_sales(sales, obj, -1 if is_cancelled else 1)
+
+
+@event.listens_for(Session, 'after_flush')
+def _apply_popularity_deltas(session, flush_context):
+    sales = session.info.pop('popularity_sales', None)
+    deltas = {}
+    if sales:
+        epoch = load_epoch(session.connection(), lock=True)
+        for product_id, quantity, sold_at in sales:
+            _add(deltas, product_id, quantity * sale_weight(sold_at, epoch))
+
+    # Новый товар сразу получает строку с нулевым score: sort=popular идет
+    # по индексу этой таблицы и товары без строки не увидел бы
+    for obj in session.new:
+        if isinstance(obj, Product):
+            deltas.setdefault(obj.id, 0)
+    removed = [obj.id for obj in session.deleted if isinstance(obj, Product)]
+
+    connection = session.connection()
+    if deltas:
+        _write_scores(connection, deltas, increment=True)
+    if removed:
+        table = ProductPopularity.__table__
+        connection.execute(delete(table).where(table.c.product_id.in_(removed)))
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_popularity_sales(session):
+    session.info.pop('popularity_sales', None)
+
+
+# Записывает score товаров одним запросом: increment=True прибавляет к текущему, иначе заменяет
+def _write_scores(connection, scores, increment):
+    now = datetime.utcnow()
+    upsert(connection, ProductPopularity.__table__, [
+        {'product_id': product_id, 'score': score, 'updated_at': now}
+        for product_id, score in sorted(scores.items())
+    ], keys=('product_id',), increment=('score',) if increment else (),
+        replace=('updated_at',) if increment else ('score', 'updated_at'))
+
+
+# Полный пересчет по order_item: после массовых операций в обход ORM, после смены half_life
+# и периодически (recompute_popularity.py), чтобы исправить накопившиеся расхождения.
+# Весь пересчет — одна транзакция под блокировкой строки popularity_epoch: заказы,
+# записанные до нее, попадают в выборку, а прибавки новых заказов ждут commit пересчета
+# и ложатся уже поверх новых score. Продажи читаются потоком, score пишутся пачками
+# по batch_size товаров
+def rebuild_popularity(batch_size=1000):
+    connection = db.session.connection()
+    # Точка отсчета переносится на сейчас; старые score все равно заменяются целиком
+    epoch = datetime.utcnow()
+    _lock_and_set_epoch(connection, epoch)
+
+    scores = {}
+    sales = (db.session.query(OrderItem.product_id, OrderItem.quantity, Order.created_at)
+             .join(Order, Order.id == OrderItem.order_id)
+             .filter(Order.status != CANCELLED)
+             .yield_per(batch_size))
+    for product_id, quantity, created_at in sales:
+        _add(scores, product_id, quantity * sale_weight(created_at, epoch))
+
+    product_ids = sorted(id for id, in db.session.query(Product.id))
+    for start in range(0, len(product_ids), batch_size):
+        batch = product_ids[start:start + batch_size]
+        _write_scores(connection, {id: scores.get(id, 0) for id in batch}, increment=False)
+
+    table = ProductPopularity.__table__
+    connection.execute(delete(table).where(table.c.product_id.not_in(select(Product.id))))
+    db.session.commit()
+    return len(product_ids)
+
+
+# Блокирует строку popularity_epoch до конца транзакции (FOR UPDATE: прибавки заказов
+# берут ее FOR SHARE и ждут) и записывает в нее epoch. Возвращает прежнюю точку отсчета
+def _lock_and_set_epoch(connection, epoch):
+    table = PopularityEpoch.__table__
+    current = connection.execute(
+        select(table.c.epoch).where(table.c.id == EPOCH_ID).with_for_update()
+    ).scalar()
+    if current is None:
+        connection.execute(table.insert().values(id=EPOCH_ID, epoch=epoch))
+        return POPULARITY_EPOCH
+    connection.execute(update(table).where(table.c.id == EPOCH_ID).values(epoch=epoch))
+    return current
+
+
+# Переносит точку отсчета на epoch (по умолчанию — сейчас) и пересчитывает все score
+# к новому масштабу одним UPDATE в одной транзакции
+def rebase_popularity(epoch=None):
+    epoch = epoch or datetime.utcnow()
+    connection = db.session.connection()
+    current = _lock_and_set_epoch(connection, epoch)
+
+    # Старые продажи при сильном переносе становятся нулем — это и есть полное затухание
+    days = (epoch - current).total_seconds() / 86400
+    exponent = days / _settings['half_life_days']
+    factor = 2 ** -max(min(exponent, MAX_WEIGHT_EXPONENT), -MAX_WEIGHT_EXPONENT)
+    scores = ProductPopularity.__table__
+    connection.execute(update(scores).values(score=scores.c.score * factor))
+    db.session.commit()
+    return epoch
+
+
+def ensure_popularity():
+    # score, посчитанные до появления popularity_epoch, переводятся к точке отсчета "сейчас"
+    if db.session.get(PopularityEpoch, EPOCH_ID) is None:
+        rebase_popularity()
+    if db.session.query(ProductPopularity.product_id).first() is None:
+        rebuild_popularity()
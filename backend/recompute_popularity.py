@@ -0,0 +1,12 @@
+# backend/recompute_popularity.py
+# Полный пересчет популярности товаров по order_item. Запускается периодически
+# (например, раз в сутки из cron): между запусками score обновляется при заказах и отменах.
+# Заодно переносит точку отсчета весов на текущий момент, чтобы веса не росли до переполнения
+from app import create_app
+from popularity import rebuild_popularity
+
+app = create_app()
+
+with app.app_context():
+    count = rebuild_popularity()
+    print(f"Product popularity recomputed: {count} products")
@@ -0,0 +1,39 @@
+# backend/response_format.py
+from flask import request
+
+# Колоночный формат списков: {"columns": [...], "<список>": [[...], ...]} — имена полей
+# передаются один раз, а не в каждом элементе. Запрашивается через ?format=columnar
+# или заголовком Accept с COLUMNAR_MIMETYPE. Вложенные списки (позиции заказа и т.п.)
+# остаются объектами
+COLUMNAR_MIMETYPE = 'application/vnd.columnar+json'
+RESPONSE_FORMATS = ('json', 'columnar')
+
+
+def columnar_requested():
+    value = request.args.get('format', '').strip()
+    if value:
+        if value not in RESPONSE_FORMATS:
+            raise ValueError(f'Invalid format value: {value}')
+        return value == 'columnar'
+    return request.accept_mimetypes.best_match(['application/json', COLUMNAR_MIMETYPE]) == COLUMNAR_MIMETYPE
+
+
+# Выбранный формат ответа для ключей кэшей и ETag: 'json' или 'columnar'.
+# Недопустимое значение ?format маршрут отклоняет с 400, здесь оно просто не совпадет с другими
+def negotiated_format():
+    try:
+        return 'columnar' if columnar_requested() else 'json'
+    except ValueError:
+        return request.args.get('format', '')
+
+
+# Словари с одинаковыми ключами (от одной функции сериализации) в (колонки, строки)
+def to_columnar(items):
+    columns = list(items[0]) if items else []
+    return columns, [list(item.values()) for item in items]
+
+
+# Формат может выбираться заголовком Accept, поэтому кэши должны его учитывать
+def vary_on_accept(response):
+    response.vary.add('Accept')
+    return response
@@ -1,66 +1,87 @@
 # backend/routes/admin.py
 from flask import Blueprint, jsonify, request
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import db, Order, DeliveryUpdate, User, Return
+from auth_claims import admin_required
+from models import db, Order, OrderItem, DeliveryUpdate, Return, ReturnItem
 from datetime import datetime
+from catalog_cache import cache_stats
+from password_hashing import password_hasher
+from sqlalchemy.orm import joinedload, selectinload
+from response_format import columnar_requested, vary_on_accept
+from streaming import stream_json_array
 
 admin_bp = Blueprint('admin', __name__)
 
 
+def serialize_order(order):
+    return {
+        'id': order.id,
+        'status': order.status,
+        'status_display': order.status_display,
+        'user_id': order.user_id,
+        'created_at': order.created_at.isoformat(),
+        'updated_at': order.updated_at.isoformat() if order.updated_at else None,
+        'shipping_address': order.shipping_address,
+        'total_amount': order.total_amount,
+        'delivery_method': order.delivery_method,
+        'tracking_number': order.tracking_number,
+        'current_location': order.current_location,
+        'estimated_delivery': order.estimated_delivery.isoformat() if order.estimated_delivery else None,
+        'items': [{
+            'product_name': item.product.name,
+            'quantity': item.quantity,
+            'price': item.price,
+            'subtotal': item.price * item.quantity
+        } for item in order.items],
+        'delivery_updates': [{
+            'status': update.status,
+            'location': update.location,
+            'timestamp': update.timestamp.isoformat(),
+            'description': update.description
+        } for update in order.delivery_updates] if order.delivery_updates else []
+    }
+
+
+def serialize_admin_return(r):
+    return {
+        'id': r.id,
+        'order_id': r.order_id,
+        'status': r.status,
+        'reason': r.reason,
+        'user_email': r.user.email,
+        'created_at': r.created_at.isoformat(),
+        'items': [{
+            'product_name': item.order_item.product.name,
+            'quantity': item.quantity,
+            'condition': item.condition
+        } for item in r.items]
+    }
+
+
 @admin_bp.route('/orders', methods=['GET'])
-@jwt_required()
+@admin_required
 def get_all_orders():
     try:
-        current_user_id = str(get_jwt_identity())  # Преобразуем в строку
-        current_user = User.query.get(int(current_user_id))  # Преобразуем обратно в число для запроса
-
-        if not current_user or current_user.email != 'admin@example.com':
-            return jsonify({'error': 'Unauthorized access'}), 403
-
-        orders = Order.query.order_by(Order.created_at.desc()).all()
-        return jsonify({
-            'orders': [{
-                'id': order.id,
-                'status': order.status,
-                'status_display': order.status_display,
-                'user_id': order.user_id,
-                'created_at': order.created_at.isoformat(),
-                'updated_at': order.updated_at.isoformat() if order.updated_at else None,
-                'shipping_address': order.shipping_address,
-                'total_amount': order.total_amount,
-                'delivery_method': order.delivery_method,
-                'tracking_number': order.tracking_number,
-                'current_location': order.current_location,
-                'estimated_delivery': order.estimated_delivery.isoformat() if order.estimated_delivery else None,
-                'items': [{
-                    'product_name': item.product.name,
-                    'quantity': item.quantity,
-                    'price': item.price,
-                    'subtotal': item.price * item.quantity
-                } for item in order.items],
-                'delivery_updates': [{
-                    'status': update.status,
-                    'location': update.location,
-                    'timestamp': update.timestamp.isoformat(),
-                    'description': update.description
-                } for update in order.delivery_updates] if order.delivery_updates else []
-            } for order in orders]
-        })
+        try:
+            columnar = columnar_requested()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        # Заказы отдаются потоком: строки читаются пачками, позиции и история доставки
+        # подгружаются одним запросом на пачку, а не на каждый заказ
+        orders = Order.query.options(
+            selectinload(Order.items).joinedload(OrderItem.product),
+            selectinload(Order.delivery_updates)
+        ).order_by(Order.created_at.desc(), Order.id.desc())
+        return vary_on_accept(stream_json_array('orders', orders, serialize_order, columnar=columnar))
     except Exception as e:
         print(f"Error in admin get_all_orders: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 
 @admin_bp.route('/orders/<int:order_id>/update-status', methods=['POST'])
-@jwt_required()
+@admin_required
 def update_order_status(order_id):
     try:
-        current_user_id = str(get_jwt_identity())
-        current_user = User.query.get(int(current_user_id))
-
-        if not current_user or current_user.email != 'admin@example.com':
-            return jsonify({'error': 'Unauthorized access'}), 403
-
         data = request.get_json()
         order = Order.query.get_or_404(order_id)
 
@@ -97,29 +118,33 @@ def update_order_status(order_id):
         return jsonify({'error': str(e)}), 500
 
 @admin_bp.route('/returns', methods=['GET'])
-@jwt_required()
+@admin_required
 def admin_get_returns():
     try:
-        current_user_id = str(get_jwt_identity())
-        current_user = User.query.get(int(current_user_id))
+        returns = Return.query.options(
+            joinedload(Return.user),
+            selectinload(Return.items).joinedload(ReturnItem.order_item).joinedload(OrderItem.product)
+        ).order_by(Return.created_at.desc(), Return.id.desc())
+        return stream_json_array('returns', returns, serialize_admin_return)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
-        if not current_user or current_user.email != 'admin@example.com':
-            return jsonify({'error': 'Unauthorized access'}), 403
+@admin_bp.route('/cache-stats', methods=['GET'])
+@admin_required
+def get_cache_stats():
+    try:
+        return jsonify({'caches': cache_stats()})
+    except Exception as e:
+        print(f"Error in admin get_cache_stats: {str(e)}")
+        return jsonify({'error': str(e)}), 500
 
-        returns = Return.query.order_by(Return.created_at.desc()).all()
-        return jsonify({
-            'returns': [{
-                'id': r.id,
-                'order_id': r.order_id,
-                'status': r.status,
-                'reason': r.reason,
-                'created_at': r.created_at.isoformat(),
-                'items': [{
-                    'product_name': item.order_item.product.name,
-                    'quantity': item.quantity,
-                    'condition': item.condition
-                } for item in r.items]
-            } for r in returns]
-        })
+# Задержки хэширования и проверки паролей: по ним подбирается PASSWORD_HASH_ITERATIONS
+# под нужную пропускную способность входа
+@admin_bp.route('/password-hash-stats', methods=['GET'])
+@admin_required
+def get_password_hash_stats():
+    try:
+        return jsonify({'password_hashing': password_hasher.stats()})
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        print(f"Error in admin get_password_hash_stats: {str(e)}")
+        return jsonify({'error': str(e)}), 500
@@ -1,8 +1,9 @@
 # backend/routes/auth.py
 from flask import Blueprint, request, jsonify
-from werkzeug.security import generate_password_hash, check_password_hash
 from flask_jwt_extended import create_access_token, get_jwt_identity
+from auth_claims import user_claims, user_is_admin
 from models import db, User
+from password_hashing import HashQueueFull, hash_password, verify_password
 from datetime import timedelta
 import logging
 
@@ -24,7 +25,8 @@ def register():
             return jsonify({'error': 'Email already exists'}), 400
 
         # Создаем пользователя
-        hashed_password = generate_password_hash(data['password'], method='pbkdf2:sha256')
+        # Хэш считается в пуле потоков password_hashing
+        hashed_password = hash_password(data['password'])
         new_user = User(
             email=data['email'],
             password=hashed_password
@@ -34,9 +36,10 @@ def register():
         db.session.commit()
 
         # Создаем токен - преобразуем id в строку
+        # Роль и версия токена кладутся в claims: права администратора проверяются без запроса к БД
         token = create_access_token(
             identity=str(new_user.id),
-            additional_claims={'email': new_user.email},
+            additional_claims=user_claims(new_user),
             fresh=True,
             expires_delta=timedelta(days=1)
         )
@@ -47,10 +50,15 @@ def register():
             'token': token,
             'user': {
                 'id': new_user.id,
-                'email': new_user.email
+                'email': new_user.email,
+                'is_admin': user_is_admin(new_user)
             }
         }), 201
 
+    except HashQueueFull as e:
+        db.session.rollback()
+        logging.warning(f"Registration rejected: {str(e)}")
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         db.session.rollback()
         logging.error(f"Registration error: {str(e)}")
@@ -68,13 +76,17 @@ def login():
         user = User.query.filter_by(email=data['email']).first()
         logging.debug(f"Found user: {user is not None}")
 
-        if not user or not check_password_hash(user.password, data['password']):
+        if not user or not verify_password(user, data['password']):
             return jsonify({'error': 'Invalid email or password'}), 401
 
+        # Хэш с устаревшими параметрами был пересчитан в verify_password
+        if user in db.session.dirty:
+            db.session.commit()
+
         # Создаем токен - преобразуем id в строку
         token = create_access_token(
             identity=str(user.id),
-            additional_claims={'email': user.email},
+            additional_claims=user_claims(user),
             fresh=True,
             expires_delta=timedelta(days=1)
         )
@@ -84,14 +96,19 @@ def login():
             'token': token,
             'user': {
                 'id': user.id,
-                'email': user.email
+                'email': user.email,
+                'is_admin': user_is_admin(user)
             }
         }
         logging.debug(f"Sending response: {response_data}")
 
         return jsonify(response_data), 200
 
+    except HashQueueFull as e:
+        logging.warning(f"Login rejected: {str(e)}")
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
+        db.session.rollback()
         logging.error(f"Login error: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
@@ -135,7 +152,8 @@ def get_current_user():
         return jsonify({
             'user': {
                 'id': user.id,
-                'email': user.email
+                'email': user.email,
+                'is_admin': user_is_admin(user)
             }
         }), 200
 
@@ -3,9 +3,39 @@ from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models import db, Order, OrderItem, Product, DeliveryUpdate
 from datetime import datetime, timedelta
+from response_format import columnar_requested, to_columnar, vary_on_accept
 
 orders_bp = Blueprint('orders', __name__)
 
+
+def serialize_order(order):
+    return {
+        'id': order.id,
+        'status': order.status,
+        'status_display': order.status_display,
+        'created_at': order.created_at.isoformat(),
+        'updated_at': order.updated_at.isoformat(),
+        'total_amount': order.total_amount,
+        'delivery_method': order.delivery_method,
+        'shipping_address': order.shipping_address,
+        'tracking_number': order.tracking_number,
+        'current_location': order.current_location,
+        'estimated_delivery': order.estimated_delivery.isoformat() if order.estimated_delivery else None,
+        'items': [{
+            'product_name': item.product.name,
+            'quantity': item.quantity,
+            'price': item.price,
+            'subtotal': item.price * item.quantity
+        } for item in order.items],
+        'delivery_updates': [{
+            'status': update.status,
+            'location': update.location,
+            'timestamp': update.timestamp.isoformat(),
+            'description': update.description
+        } for update in order.delivery_updates]
+    }
+
+
 @orders_bp.route('/', methods=['POST'])
 @jwt_required()
 def create_order():
@@ -93,35 +123,18 @@ def create_order():
 def get_orders():
     try:
         user_id = get_jwt_identity()
-        orders = Order.query.filter_by(user_id=user_id).order_by(Order.created_at.desc()).all()
-
-        return jsonify({
-            'orders': [{
-                'id': order.id,
-                'status': order.status,
-                'status_display': order.status_display,
-                'created_at': order.created_at.isoformat(),
-                'updated_at': order.updated_at.isoformat(),
-                'total_amount': order.total_amount,
-                'delivery_method': order.delivery_method,
-                'shipping_address': order.shipping_address,
-                'tracking_number': order.tracking_number,
-                'current_location': order.current_location,
-                'estimated_delivery': order.estimated_delivery.isoformat() if order.estimated_delivery else None,
-                'items': [{
-                    'product_name': item.product.name,
-                    'quantity': item.quantity,
-                    'price': item.price,
-                    'subtotal': item.price * item.quantity
-                } for item in order.items],
-                'delivery_updates': [{
-                    'status': update.status,
-                    'location': update.location,
-                    'timestamp': update.timestamp.isoformat(),
-                    'description': update.description
-                } for update in order.delivery_updates]
-            } for order in orders]
-        })
+        try:
+            columnar = columnar_requested()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        orders = [serialize_order(order) for order in
+                  Order.query.filter_by(user_id=user_id).order_by(Order.created_at.desc()).all()]
+
+        if columnar:
+            columns, rows = to_columnar(orders)
+            return vary_on_accept(jsonify({'columns': columns, 'orders': rows}))
+        return vary_on_accept(jsonify({'orders': orders}))
     except Exception as e:
         print(f"Error fetching orders: {str(e)}")
         return jsonify({"error": str(e)}), 500
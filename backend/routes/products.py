@@ -1,38 +1,468 @@
 # backend/routes/products.py
-from flask import Blueprint, jsonify, request
-from models import db, Product
-from sqlalchemy import or_
+from flask import Blueprint, current_app, jsonify, request
+from models import db, Product, ProductPopularity
+from catalog_cache import (SEARCH_FACETS, facet_cache, list_cache, product_cache, read_through,
+                           read_through_many)
+from catalog_snapshot import get_catalog_snapshot
+from catalog_version import catalog_cached, current_version
+from change_log import load_changes
+from co_purchase import load_related
+from facets import PRICE_BUCKETS, count_facets, get_facets
+from filter_engine import get_filter_engine
+from json_provider import Fragment, product_fragments
+from response_format import columnar_requested, vary_on_accept
+from search import (SEARCH_MODES, RANKED_SEARCH_MODES, apply_fulltext, apply_fuzzy, apply_ilike,
+                    default_search_mode, fulltext_supported)
+from specs import apply_spec_filters, parse_spec_filters
+from suggest_index import get_suggest_index
+from view_counter import record_view
+from sqlalchemy import Integer, String, and_, or_, tuple_
+import base64
+import json
+import math
 
 products_bp = Blueprint('products', __name__)
 
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 100
+
+# Режимы сортировки: список (колонка, по убыванию). Последней всегда идет id,
+# чтобы порядок был однозначным и курсор не пропускал/не дублировал товары.
+SORT_MODES = {
+    'newest': [(Product.id, True)],
+    'price_asc': [(Product.price, False), (Product.id, False)],
+    'price_desc': [(Product.price, True), (Product.id, True)],
+    'name': [(Product.name, False), (Product.id, False)],
+    # Бестселлеры: по заранее посчитанной популярности (popularity.py), через индекс product_popularity
+    'popular': [(ProductPopularity.score, True), (ProductPopularity.product_id, True)],
+}
+POPULAR_SORT = 'popular'
+DEFAULT_SORT = 'newest'
+
+# Поля товара, которые можно запросить через ?fields=, и именованные проекции.
+# В списках по умолчанию отдается "card": без длинного описания, которое
+# карточка в каталоге не показывает, а в объеме ответа занимает больше всего
+PRODUCT_FIELDS = {
+    'id': Product.id,
+    'name': Product.name,
+    'description': Product.description,
+    'price': Product.price,
+    'stock': Product.stock,
+    'category': Product.category,
+    'image_url': Product.image_url,
+    'attributes': Product.attributes,
+}
+PROJECTIONS = {
+    'card': ('id', 'name', 'price', 'stock', 'category', 'image_url'),
+    'full': tuple(PRODUCT_FIELDS),
+}
+DEFAULT_LIST_PROJECTION = 'card'
+
+MAX_BATCH_IDS = 300
+
+# Сколько изменений отдается за один запрос дельта-синхронизации
+MAX_CHANGES = 500
+
+DEFAULT_RELATED_LIMIT = 8
+MAX_RELATED_LIMIT = 24
+
+DEFAULT_SUGGEST_LIMIT = 8
+MAX_SUGGEST_LIMIT = 20
+# Сортировка по релевантности доступна только вместе с полнотекстовым/нечетким поиском
+RELEVANCE_SORT = 'relevance'
+# Сортировки, которые умеет отдавать снимок каталога (catalog_snapshot.py)
+# и движок фильтров на битовых картах (filter_engine.py)
+SNAPSHOT_SORTS = ('newest', 'price_asc', 'price_desc')
+ENGINE_SORTS = SNAPSHOT_SORTS
+
+
+def sort_keys(sort, rank=None):
+    if sort == RELEVANCE_SORT:
+        return [(rank, True), (Product.id, True)]
+    return SORT_MODES[sort]
+
+
+def encode_cursor(sort, values):
+    raw = json.dumps([sort, values], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, sort, keys):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        cursor_sort, values = json.loads(raw)
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+
+    if cursor_sort != sort or not isinstance(values, list) or len(values) != len(keys):
+        raise ValueError('Cursor does not match sort mode')
+    # Значения уходят в сравнение с колонками в БД, в движке фильтров и в снимке каталога,
+    # поэтому тип каждого проверяется по его ключу сортировки
+    if not all(_cursor_value_valid(column, value) for (column, _), value in zip(keys, values)):
+        raise ValueError('Invalid cursor')
+    return values
+
+
+def _cursor_value_valid(column, value):
+    if isinstance(value, bool):
+        return False
+    if isinstance(column.type, Integer):
+        return isinstance(value, int)
+    if isinstance(column.type, String):
+        return isinstance(value, str)
+    # Цена, популярность, релевантность
+    return isinstance(value, (int, float)) and math.isfinite(value)
+
+
+def apply_keyset(query, keys, values):
+    columns = [column for column, _ in keys]
+    # Все ключи в одном режиме сортируются в одну сторону, поэтому хватает
+    # сравнения кортежей, которое БД умеет отдавать через составной индекс
+    if keys[0][1]:
+        return query.filter(tuple_(*columns) < tuple_(*values))
+    return query.filter(tuple_(*columns) > tuple_(*values))
+
+
+def order_by_keys(query, keys):
+    return query.order_by(*[column.desc() if desc else column.asc() for column, desc in keys])
+
+
+def parse_fields(value):
+    value = (value or '').strip() or DEFAULT_LIST_PROJECTION
+    if value in PROJECTIONS:
+        return PROJECTIONS[value]
+
+    fields = [field.strip() for field in value.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in PRODUCT_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    # id нужен всегда: по нему клиент ссылается на товар
+    return tuple(['id'] + [field for field in PRODUCT_FIELDS if field in fields and field != 'id'])
+
+
+# Мультивыбор в фильтрах: значения через запятую (?category=TV,Phones)
+def parse_list(value):
+    return tuple(sorted({item.strip() for item in (value or '').split(',') if item.strip()}))
+
+
+def parse_price_buckets(value):
+    try:
+        buckets = tuple(sorted({int(item) for item in parse_list(value)}))
+    except ValueError:
+        raise ValueError('Invalid price_bucket value')
+    if any(not 0 <= bucket < len(PRICE_BUCKETS) for bucket in buckets):
+        raise ValueError('Invalid price_bucket value')
+    return buckets
+
+
+def serialize_product(product):
+    return {
+        'id': product.id,
+        'name': product.name,
+        'description': product.description,
+        'price': product.price,
+        'stock': product.stock,
+        'category': product.category,
+        'image_url': product.image_url,
+        'attributes': product.attributes
+    }
+
+
+def load_product(id):
+    product = Product.query.get(id)
+    return serialize_product(product) if product else None
+
 
 @products_bp.route('/<int:id>', methods=['GET'])
+@catalog_cached
 def get_product(id):
     try:
         print(f"Fetching product with ID: {id}")  # Добавляем логирование
-        product = Product.query.get(id)
+
+        # Если есть актуальный снимок каталога, готовый JSON берется прямо из него
+        snapshot = get_catalog_snapshot()
+        if snapshot is not None:
+            index = snapshot.find(id)
+            if index is None:
+                return jsonify({'error': 'Product not found'}), 404
+            record_view(id)
+            return jsonify(Fragment(snapshot.product_json(index, 'full').decode()))
+
+        # Отсутствующий товар тоже кэшируется (на короткое время), чтобы 404 не ходили в БД
+        product = read_through(product_cache, id, lambda: load_product(id))
 
         if not product:
             print(f"Product with ID {id} not found")  # Добавляем логирование
             return jsonify({'error': 'Product not found'}), 404
 
         # Добавляем логирование найденного продукта
-        print(f"Found product: {product.name}")
+        print(f"Found product: {product['name']}")
+        # Просмотр только существующего товара считается в памяти, в БД счетчики уходят пакетом по таймеру
+        record_view(id)
+
+        return jsonify(product)
+    except Exception as e:
+        print(f"Error fetching product: {str(e)}")  # Добавляем логирование ошибки
+        return jsonify({'error': str(e)}), 500
+
+def load_products(ids):
+    products = Product.query.filter(Product.id.in_(ids)).all()
+    return {product.id: serialize_product(product) for product in products}
+
+
+@products_bp.route('/batch', methods=['GET'])
+@catalog_cached
+def get_products_batch():
+    try:
+        try:
+            ids = [int(value) for value in request.args.get('ids', '').split(',') if value.strip()]
+        except ValueError:
+            return jsonify({'error': 'ids must be a comma-separated list of integers'}), 400
+
+        # Убираем повторы, сохраняя порядок, в котором id запросили
+        ids = list(dict.fromkeys(ids))
+        if not ids:
+            return jsonify({'error': 'ids is required'}), 400
+        if len(ids) > MAX_BATCH_IDS:
+            return jsonify({'error': f'At most {MAX_BATCH_IDS} ids per request'}), 400
+
+        # Найденное в кэше карточек не запрашивается, остальное — одним WHERE id IN (...)
+        products = read_through_many(product_cache, ids, load_products)
 
         return jsonify({
-            'id': product.id,
-            'name': product.name,
-            'description': product.description,
-            'price': product.price,
-            'stock': product.stock,
-            'category': product.category,
-            'image_url': product.image_url
+            'products': [products[id] for id in ids if products[id]],
+            'missing': [id for id in ids if not products[id]]
         })
     except Exception as e:
-        print(f"Error fetching product: {str(e)}")  # Добавляем логирование ошибки
+        print(f"Error fetching product batch: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+# Дельта-синхронизация: товары, созданные, измененные или удаленные после версии since.
+# Клиент хранит полученную version и передает ее в следующий раз; since=0 — полная выгрузка.
+# Пока has_more, запрос сразу повторяют с новой версией. Ответ определяется общим журналом,
+# а не версией каталога процесса, поэтому catalog_cached (ETag и max-age) здесь не применяется
+@products_bp.route('/changes', methods=['GET'])
+def get_product_changes():
+    try:
+        try:
+            since = int(request.args.get('since', 0))
+        except ValueError:
+            return jsonify({'error': 'Invalid since value'}), 400
+        if since < 0:
+            return jsonify({'error': 'Invalid since value'}), 400
+
+        changes, version, has_more = load_changes(since, MAX_CHANGES)
+
+        # Актуальные данные измененных товаров берем из БД одним запросом, а не из кэша
+        # процесса: реплика клиента должна совпадать с таблицей
+        updated_ids = [change.product_id for change in changes if not change.deleted]
+        products = load_products(updated_ids) if updated_ids else {}
+
+        return jsonify({
+            'products': [products[id] for id in updated_ids if id in products],
+            # Товар мог быть удален уже после чтения журнала — тоже отдаем как удаленный
+            'deleted': [change.product_id for change in changes
+                        if change.deleted or change.product_id not in products],
+            'version': version,
+            'has_more': has_more
+        })
+    except Exception as e:
+        print(f"Error fetching product changes: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+# "Часто покупают вместе": из заранее посчитанной таблицы product_co_purchase, без
+# самосоединения order_item на каждый запрос
+@products_bp.route('/<int:id>/related', methods=['GET'])
+@catalog_cached
+def get_related_products(id):
+    try:
+        try:
+            limit = int(request.args.get('limit', DEFAULT_RELATED_LIMIT))
+        except ValueError:
+            return jsonify({'error': 'Invalid limit value'}), 400
+        limit = max(1, min(limit, MAX_RELATED_LIMIT))
+
+        fields = PROJECTIONS[DEFAULT_LIST_PROJECTION]
+        version = current_version()
+        rows = load_related(id, [PRODUCT_FIELDS[field] for field in fields], limit)
+        # Пустой ответ бывает и у товара без совместных покупок, и у несуществующего
+        if not rows and db.session.get(Product, id) is None:
+            return jsonify({'error': 'Product not found'}), 404
+
+        return jsonify({'product_id': id, 'products': page_products(rows, fields, False, version)})
+    except Exception as e:
+        print(f"Error fetching related products: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@products_bp.route('/suggest', methods=['GET'])
+@catalog_cached
+def suggest_products():
+    try:
+        query = request.args.get('q', '').strip()
+        try:
+            limit = int(request.args.get('limit', DEFAULT_SUGGEST_LIMIT))
+        except ValueError:
+            return jsonify({'error': 'Invalid limit value'}), 400
+        limit = max(1, min(limit, MAX_SUGGEST_LIMIT))
+
+        # Подсказки отдаются из индекса в памяти, без запроса к БД
+        suggestions = get_suggest_index().suggest(query, limit)
+        return jsonify({'query': query, **suggestions})
+    except Exception as e:
+        print(f"Error fetching suggestions: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+def parse_price(value, name):
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        print(f"Invalid {name} value: {value}")
+        return None
+
+
+# Страница списка из снимка каталога или None, если запрос снимку не по силам
+# (поиск, сортировка по имени или релевантности, произвольный набор полей)
+def load_snapshot_page(snapshot, filters, sort, cursor, limit, fields):
+    projection = next((name for name, value in PROJECTIONS.items() if value == fields), None)
+    if (filters['search'] or sort not in SNAPSHOT_SORTS or projection not in snapshot.projections
+            or len(filters['categories']) > 1 or filters['price_buckets'] or filters['in_stock']
+            or filters['specs']):
+        return None
+
+    keys = sort_keys(sort)
+    after = decode_cursor(cursor, sort, keys) if cursor else None
+    category = filters['categories'][0] if filters['categories'] else None
+    indexes = snapshot.scan(category, filters['min_price'], filters['max_price'], sort, after, limit + 1)
+
+    next_cursor = None
+    if len(indexes) > limit:
+        indexes = indexes[:limit]
+        product_id, price = snapshot.record(indexes[-1])[:2]
+        next_cursor = encode_cursor(sort, [product_id] if sort == 'newest' else [price, product_id])
+
+    return {
+        'products': [Fragment(snapshot.product_json(index, projection).decode()) for index in indexes],
+        'next_cursor': next_cursor
+    }
+
+
+def price_bucket_condition(bucket):
+    lower = PRICE_BUCKETS[bucket]
+    if bucket + 1 < len(PRICE_BUCKETS):
+        return and_(Product.price >= lower, Product.price < PRICE_BUCKETS[bucket + 1])
+    return Product.price >= lower
+
+
+def page_products(rows, fields, columnar, version):
+    # В колоночном формате товар — просто значения запрошенных полей
+    if columnar:
+        return [list(row[:len(fields)]) for row in rows]
+    # Иначе товары отдаются готовыми JSON-фрагментами: повторно встречающиеся товары
+    # (на других страницах, в других фильтрах) не кодируются заново
+    return product_fragments(fields, rows, version)
+
+
+# Страница из движка фильтров: id страницы и фасеты считаются на битовых картах,
+# из БД одним запросом по первичному ключу читаются только товары страницы.
+# Возвращает (страница, фасеты, категории) или None, если запрос движку не по силам
+def load_engine_page(filters, sort, cursor, limit, fields, columnar):
+    if filters['search'] or filters['specs'] or sort not in ENGINE_SORTS:
+        return None
+
+    keys = sort_keys(sort)
+    after = decode_cursor(cursor, sort, keys) if cursor else None
+    ids, facets, categories = get_filter_engine().query(
+        filters['categories'], filters['price_buckets'], filters['min_price'], filters['max_price'],
+        filters['in_stock'], sort, after, limit + 1)
+
+    version = current_version()
+    rows = {row[0]: row for row in db.session.query(*[PRODUCT_FIELDS[field] for field in fields])
+            .add_columns(Product.price).filter(Product.id.in_(ids))} if ids else {}
+    rows = [rows[id] for id in ids if id in rows]
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(sort, [last[0]] if sort == 'newest' else [last[-1], last[0]])
+
+    page = {
+        'products': page_products(rows, fields, columnar, version),
+        'next_cursor': next_cursor
+    }
+    return page, facets, categories
+
+
+# Применяем поиск: tsvector + GIN в PostgreSQL, триграммы в памяти для
+# нечеткого поиска, ILIKE как запасной вариант. Возвращает (query, rank)
+def apply_search(query, filters):
+    search = filters['search']
+    if not search:
+        return query, None
+    if filters['search_mode'] == 'fulltext':
+        return apply_fulltext(query, search)
+    if filters['search_mode'] == 'fuzzy':
+        return apply_fuzzy(query, search)
+    return apply_ilike(query, search), None
+
+
+# Счетчики фасетов по товарам, подходящим под поиск и характеристики: таблица
+# product_facet их не учитывает. Остальные фильтры применяет get_facets, как обычно
+def load_search_facet_rows(filters):
+    query, _ = apply_search(db.session.query(Product), filters)
+    return count_facets(apply_spec_filters(query, filters['specs']))
+
+
+def load_page(filters, sort, cursor, limit, fields, columnar=False):
+    version = current_version()
+
+    # Выбираем только запрошенные колонки, а не ORM-объекты целиком
+    query = db.session.query(*[PRODUCT_FIELDS[field] for field in fields])
+    if sort == POPULAR_SORT:
+        query = query.join(ProductPopularity, ProductPopularity.product_id == Product.id)
+
+    query, rank = apply_search(query, filters)
+
+    # Фильтр по категориям
+    if filters['categories']:
+        query = query.filter(Product.category.in_(filters['categories']))
+    if filters['in_stock']:
+        query = query.filter(Product.stock > 0)
+
+    # Фильтры по цене
+    if filters['min_price'] is not None:
+        query = query.filter(Product.price >= filters['min_price'])
+    if filters['max_price'] is not None:
+        query = query.filter(Product.price <= filters['max_price'])
+    if filters['price_buckets']:
+        query = query.filter(or_(*[price_bucket_condition(bucket) for bucket in filters['price_buckets']]))
+
+    # Фильтры по характеристикам: равенства через GIN-индекс, диапазоны по индексам выражений
+    query = apply_spec_filters(query, filters['specs'])
+
+    # Keyset-пагинация: продолжаем строго после последнего товара прошлой страницы
+    keys = sort_keys(sort, rank)
+    if cursor:
+        query = apply_keyset(query, keys, decode_cursor(cursor, sort, keys))
+
+    # Значения ключей сортировки выбираем вместе со строкой, из них строится курсор.
+    # Получаем на один товар больше, чтобы понять, есть ли следующая страница
+    rows = order_by_keys(query, keys).add_columns(*[column for column, _ in keys]).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(sort, list(rows[-1][len(fields):]))
+
+    return {
+        'products': page_products(rows, fields, columnar, version),
+        'next_cursor': next_cursor
+    }
+
+
 @products_bp.route('/', methods=['GET'])
+@catalog_cached
 def get_products():
     try:
         # Логируем входящие параметры
@@ -40,69 +470,103 @@ def get_products():
 
         # Получаем параметры фильтрации
         search = request.args.get('search', '').strip()
-        category = request.args.get('category', '').strip()
-        min_price = request.args.get('min_price')
-        max_price = request.args.get('max_price')
-
-        # Начинаем с базового запроса
-        query = Product.query
-
-        # Применяем поиск по названию и описанию
-        if search:
-            search_term = f"%{search}%"
-            query = query.filter(
-                or_(
-                    Product.name.ilike(search_term),
-                    Product.description.ilike(search_term)
-                )
-            )
-
-        # Фильтр по категории
-        if category:
-            query = query.filter(Product.category == category)
-
-        # Фильтры по цене
-        if min_price:
-            try:
-                min_price = float(min_price)
-                query = query.filter(Product.price >= min_price)
-            except ValueError:
-                print(f"Invalid min_price value: {min_price}")
-
-        if max_price:
-            try:
-                max_price = float(max_price)
-                query = query.filter(Product.price <= max_price)
-            except ValueError:
-                print(f"Invalid max_price value: {max_price}")
-
-        # Получаем все категории для фильтра
-        categories = db.session.query(Product.category).distinct().all()
-        categories = [cat[0] for cat in categories if cat[0]]
-
-        # Получаем продукты
-        products = query.all()
+        categories = parse_list(request.args.get('category'))
+        in_stock = request.args.get('in_stock', '').strip() in ('1', 'true')
+        min_price = parse_price(request.args.get('min_price'), 'min_price')
+        max_price = parse_price(request.args.get('max_price'), 'max_price')
+        search_mode = request.args.get('search_mode', '').strip() or default_search_mode()
+        sort = request.args.get('sort', '').strip()
+        cursor = request.args.get('cursor', '').strip()
+
+        if search_mode not in SEARCH_MODES:
+            return jsonify({'error': f'Invalid search_mode value: {search_mode}'}), 400
+        if search_mode == 'fulltext' and not fulltext_supported():
+            return jsonify({'error': 'Full-text search is not available on this database'}), 400
+
+        # Для полнотекстового и нечеткого поиска по умолчанию сортируем по релевантности
+        ranked = bool(search) and search_mode in RANKED_SEARCH_MODES
+        if not sort:
+            sort = RELEVANCE_SORT if ranked else DEFAULT_SORT
+        if sort not in SORT_MODES and not (sort == RELEVANCE_SORT and ranked):
+            return jsonify({'error': f'Invalid sort value: {sort}'}), 400
+
+        try:
+            limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+        except ValueError:
+            return jsonify({'error': 'Invalid limit value'}), 400
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+        try:
+            fields = parse_fields(request.args.get('fields'))
+            columnar = columnar_requested()
+            price_buckets = parse_price_buckets(request.args.get('price_bucket'))
+            specs = parse_spec_filters(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        filters = {
+            'search': search,
+            'search_mode': search_mode if search else None,
+            'categories': categories,
+            'min_price': min_price,
+            'max_price': max_price,
+            'price_buckets': price_buckets,
+            'in_stock': in_stock,
+            'specs': specs
+        }
+
+        # Страница кэшируется по нормализованному запросу; фильтры сохраняются рядом,
+        # чтобы при изменении товара сбрасывать только страницы, под которые он подходит
+        page_key = (tuple(filters.values()), sort, cursor, limit, fields, columnar)
+        try:
+            # Движок фильтров на битовых картах сразу отдает и страницу, и фасеты
+            engine_page = None
+            if current_app.config['CATALOG_FILTER_ENGINE']:
+                engine_page = load_engine_page(filters, sort, cursor, limit, fields, columnar)
+
+            if engine_page is not None:
+                page, facets, category_names = engine_page
+            else:
+                # Снимок каталога общий для всех воркеров и сам служит кэшем страниц
+                snapshot = None if columnar else get_catalog_snapshot()
+                page = load_snapshot_page(snapshot, filters, sort, cursor, limit, fields) if snapshot else None
+                if page is None:
+                    page = read_through(list_cache, page_key,
+                                        lambda: load_page(filters, sort, cursor, limit, fields, columnar),
+                                        tags=filters)
+
+                # Категории и фасеты для фильтра берем из поддерживаемой таблицы product_facet,
+                # а при поиске или фильтре по характеристикам — из GROUP BY по подходящим товарам
+                facet_filters = (categories, min_price, max_price, price_buckets, in_stock)
+                if search or specs:
+                    facets, category_names = read_through(
+                        facet_cache, facet_filters + (search, search_mode, specs),
+                        lambda: get_facets(*facet_filters, rows=load_search_facet_rows(filters)),
+                        tags=SEARCH_FACETS)
+                else:
+                    facets, category_names = read_through(facet_cache, facet_filters,
+                                                          lambda: get_facets(*facet_filters))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
 
         # Логируем результаты
-        print(f"Found {len(products)} products matching criteria")
+        print(f"Found {len(page['products'])} products matching criteria")
 
         response_data = {
-            'products': [{
-                'id': p.id,
-                'name': p.name,
-                'description': p.description,
-                'price': p.price,
-                'stock': p.stock,
-                'category': p.category,
-                'image_url': p.image_url
-            } for p in products],
-            'categories': categories
+            'products': page['products'],
+            'categories': category_names,
+            'facets': facets,
+            'next_cursor': page['next_cursor'],
+            'sort': sort,
+            'search_mode': search_mode,
+            'fields': list(fields),
+            'limit': limit
         }
+        if columnar:
+            response_data['columns'] = list(fields)
 
-        return jsonify(response_data)
+        return vary_on_accept(jsonify(response_data))
 
     except Exception as e:
         print(f"Error fetching products: {str(e)}")
         return jsonify({'error': f'Failed to fetch products: {str(e)}'}), 500
-
-
@@ -1,13 +1,37 @@
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import db, Return, ReturnItem, Order, OrderItem, Product, User
+from auth_claims import admin_required
+from models import db, Return, ReturnItem, Order, OrderItem, Product
 from datetime import datetime
+from sqlalchemy.orm import joinedload, selectinload
+from streaming import stream_json_array
 
 from routes.admin import admin_bp
 
 returns_bp = Blueprint('returns', __name__)
 
 
+def serialize_return_details(r):
+    return {
+        'id': r.id,
+        'order_id': r.order_id,
+        'user_email': r.user.email,
+        'status': r.status,
+        'status_display': r.status_display,
+        'created_at': r.created_at.isoformat(),
+        'reason': r.reason,
+        'comments': r.comments,
+        'refund_amount': r.refund_amount,
+        'items': [{
+            'id': item.id,
+            'product_name': item.order_item.product.name,
+            'quantity': item.quantity,
+            'reason': item.reason,
+            'condition': item.condition
+        } for item in r.items]
+    }
+
+
 @returns_bp.route('/', methods=['GET', 'POST', 'OPTIONS'])
 @jwt_required(optional=True)
 def handle_returns():
@@ -142,54 +166,25 @@ def get_return(return_id):
 
 
 @returns_bp.route('/admin/returns', methods=['GET'])
-@jwt_required()
+@admin_required
 def admin_get_returns():
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
-
-        if not user or user.email != 'admin@example.com':
-            return jsonify({'error': 'Unauthorized'}), 403
-
-        returns = Return.query.order_by(Return.created_at.desc()).all()
-
-        return jsonify({
-            'returns': [{
-                'id': r.id,
-                'order_id': r.order_id,
-                'user_email': r.user.email,
-                'status': r.status,
-                'status_display': r.status_display,
-                'created_at': r.created_at.isoformat(),
-                'reason': r.reason,
-                'comments': r.comments,
-                'refund_amount': r.refund_amount,
-                'items': [{
-                    'id': item.id,
-                    'product_name': item.order_item.product.name,
-                    'quantity': item.quantity,
-                    'reason': item.reason,
-                    'condition': item.condition
-                } for item in r.items]
-            } for r in returns]
-        })
+        returns = Return.query.options(
+            joinedload(Return.user),
+            selectinload(Return.items).joinedload(ReturnItem.order_item).joinedload(OrderItem.product)
+        ).order_by(Return.created_at.desc(), Return.id.desc())
+        return stream_json_array('returns', returns, serialize_return_details)
     except Exception as e:
         print(f"Error fetching admin returns: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 
 @admin_bp.route('/returns/<int:return_id>/update-status', methods=['POST', 'OPTIONS'])
-@jwt_required(optional=True)
+@admin_required
 def admin_update_return_status(return_id):
     if request.method == 'OPTIONS':
         return '', 200
 
-    current_user_id = str(get_jwt_identity())
-    current_user = User.query.get(int(current_user_id))
-
-    if not current_user or current_user.email != 'admin@example.com':
-        return jsonify({'error': 'Unauthorized access'}), 403
-
     data = request.get_json()
     return_request = Return.query.get_or_404(return_id)
     return_request.status = data['status']
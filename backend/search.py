@@ -0,0 +1,84 @@
+# backend/search.py
+from models import db, Product
+from search_index import get_search_index
+from sqlalchemy import case, cast, func, literal, literal_column, or_, text
+from sqlalchemy.dialects.postgresql import DOUBLE_PRECISION
+
+# Конфигурация 'simple' не делает стемминг, поэтому одинаково работает для
+# названий моделей, брендов и русского/английского текста
+FTS_CONFIG = 'simple'
+
+SEARCH_MODES = ('fulltext', 'ilike', 'fuzzy')
+# Режимы, в которых у результата есть оценка релевантности
+RANKED_SEARCH_MODES = ('fulltext', 'fuzzy')
+
+# Сколько лучших совпадений триграммного индекса передается в SQL-запрос
+FUZZY_MAX_CANDIDATES = 500
+
+# Генерируемая колонка хранится только в PostgreSQL, модель о ней не знает,
+# чтобы SQLite и тесты создавали таблицу product как раньше
+SEARCH_VECTOR_DDL = [
+    f"""
+    ALTER TABLE product ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('{FTS_CONFIG}', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('{FTS_CONFIG}', coalesce(category, '')), 'B') ||
+        setweight(to_tsvector('{FTS_CONFIG}', coalesce(description, '')), 'C')
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_product_search_vector ON product USING GIN (search_vector)",
+]
+
+search_vector = literal_column('product.search_vector')
+
+
+def fulltext_supported():
+    return db.engine.dialect.name == 'postgresql'
+
+
+# Добавляет tsvector-колонку и GIN-индекс (идемпотентно, только PostgreSQL)
+def ensure_search_vector():
+    if not fulltext_supported():
+        return False
+
+    for statement in SEARCH_VECTOR_DDL:
+        db.session.execute(text(statement))
+    db.session.commit()
+    return True
+
+
+def default_search_mode():
+    return 'fulltext' if fulltext_supported() else 'ilike'
+
+
+# Фильтрует по tsvector и возвращает (query, rank) для сортировки по релевантности.
+# ts_rank возвращает real, а значение из курсора приходит как double precision: без
+# приведения сравнение (rank, id) с курсором неточное и товары с равным rank
+# повторяются или пропадают между страницами. float4 -> float8 переводится точно,
+# и double без потерь проходит через JSON курсора
+def apply_fulltext(query, search):
+    ts_query = func.websearch_to_tsquery(FTS_CONFIG, search)
+    rank = cast(func.ts_rank(search_vector, ts_query), DOUBLE_PRECISION)
+    return query.filter(search_vector.op('@@')(ts_query)), rank
+
+
+def apply_ilike(query, search):
+    search_term = f"%{search}%"
+    return query.filter(
+        or_(
+            Product.name.ilike(search_term),
+            Product.description.ilike(search_term)
+        )
+    )
+
+
+# Нечеткий поиск по триграммному индексу в памяти: работает на любой БД,
+# в SQL уходит только список id кандидатов и их оценки
+def apply_fuzzy(query, search):
+    matches = get_search_index().search(search, limit=FUZZY_MAX_CANDIDATES)
+    if not matches:
+        return query.filter(literal(False)), literal(0.0)
+
+    scores = dict(matches)
+    rank = case(scores, value=Product.id, else_=0.0)
+    return query.filter(Product.id.in_(list(scores))), rank
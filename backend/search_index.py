@@ -0,0 +1,227 @@
+# backend/search_index.py
+import heapq
+import re
+import sys
+import threading
+from collections import Counter
+from operator import itemgetter
+
+from catalog_events import on_product_change
+from catalog_version import load_product_rows, on_remote_change
+from models import db, Product
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+# Совпадения в описании весят меньше, чем в названии и категории
+DESCRIPTION_WEIGHT = 0.5
+# Слова описания, которые встречаются у большой доли товаров, ничего не различают
+# (как стоп-слова) и только раздувают список кандидатов, поэтому при поиске пропускаются
+MAX_DESCRIPTION_SHARE = 0.05
+MIN_DESCRIPTION_IDS = 50
+# Минимальная похожесть слова запроса и слова из каталога (коэффициент Жаккара по триграммам)
+WORD_THRESHOLD = 0.4
+# Минимальная итоговая оценка товара
+DEFAULT_THRESHOLD = 0.3
+
+
+def words(text):
+    return {sys.intern(word) for word in WORD_RE.findall((text or '').lower())}
+
+
+def trigrams(word):
+    # Как в pg_trgm: слово дополняется двумя пробелами слева и одним справа
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    # Двухуровневый индекс: триграммы ищут похожие слова в словаре каталога,
+    # а слова ведут к товарам. Словарь намного меньше числа товаров, поэтому
+    # нечеткое сравнение идет по нему, а по товарам — только объединение списков id.
+    # Слова из названия и категории хранятся отдельно от слов описания.
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+        self.built = False
+
+    def _reset(self):
+        self._documents = {}
+        self._primary = {}
+        self._description = {}
+        self._vocabulary = {}
+        self._grams = {}
+
+    def build(self, products):
+        with self._lock:
+            self._reset()
+            for product in products:
+                self._add(product['id'], product)
+            self.built = True
+
+    def upsert(self, product_id, product):
+        with self._lock:
+            self._remove(product_id)
+            self._add(product_id, product)
+
+    def remove(self, product_id):
+        with self._lock:
+            self._remove(product_id)
+
+    def _add(self, product_id, product):
+        primary = words(product.get('name')) | words(product.get('category'))
+        description = words(product.get('description')) - primary
+        self._documents[product_id] = (tuple(primary), tuple(description))
+        for postings, document_words in ((self._primary, primary), (self._description, description)):
+            for word in document_words:
+                ids = postings.get(word)
+                if ids is None:
+                    ids = postings[word] = set()
+                    self._add_word(word)
+                ids.add(product_id)
+
+    def _remove(self, product_id):
+        document = self._documents.pop(product_id, None)
+        if document is None:
+            return
+        for postings, document_words in zip((self._primary, self._description), document):
+            for word in document_words:
+                ids = postings.get(word)
+                if ids is None:
+                    continue
+                ids.discard(product_id)
+                if not ids:
+                    del postings[word]
+                    self._drop_word(word)
+
+    def _add_word(self, word):
+        if word in self._vocabulary:
+            return
+        grams = trigrams(word)
+        self._vocabulary[word] = len(grams)
+        for gram in grams:
+            self._grams.setdefault(gram, set()).add(word)
+
+    def _drop_word(self, word):
+        if word in self._primary or word in self._description:
+            return
+        if self._vocabulary.pop(word, None) is None:
+            return
+        for gram in trigrams(word):
+            vocabulary_words = self._grams.get(gram)
+            if vocabulary_words is not None:
+                vocabulary_words.discard(word)
+                if not vocabulary_words:
+                    del self._grams[gram]
+
+    def similar_words(self, word, threshold=WORD_THRESHOLD):
+        grams = trigrams(word)
+        common = Counter()
+        for gram in grams:
+            vocabulary_words = self._grams.get(gram)
+            if vocabulary_words:
+                common.update(vocabulary_words)
+
+        total = len(grams)
+        # Жаккар не больше common / total, поэтому слабые кандидаты отсекаются сразу
+        min_common = threshold * total
+        vocabulary = self._vocabulary
+        matches = []
+        for candidate, hits in common.items():
+            if hits >= min_common:
+                similarity = hits / (total + vocabulary[candidate] - hits)
+                if similarity >= threshold:
+                    matches.append((similarity, candidate))
+        return matches
+
+    # Возвращает [(product_id, score)] по убыванию score. score — среднее по словам
+    # запроса лучшей похожести слова товара (1.0 — все слова точно есть в названии/категории)
+    def search(self, query, limit=100, threshold=DEFAULT_THRESHOLD):
+        query_words = words(query)
+        if not query_words:
+            return []
+
+        scores = Counter()
+        with self._lock:
+            max_description_ids = max(MIN_DESCRIPTION_IDS, len(self._documents) * MAX_DESCRIPTION_SHARE)
+            for query_word in query_words:
+                # Сначала слабые совпадения, чтобы более похожие слова их перезаписали
+                similar = sorted(self.similar_words(query_word))
+                best = {}
+                for similarity, word in similar:
+                    ids = self._description.get(word)
+                    if ids and len(ids) <= max_description_ids:
+                        best.update(dict.fromkeys(ids, similarity * DESCRIPTION_WEIGHT))
+                for similarity, word in similar:
+                    ids = self._primary.get(word)
+                    if ids:
+                        best.update(dict.fromkeys(ids, similarity))
+                scores.update(best)
+
+        total = len(query_words)
+        min_score = threshold * total
+        return [(product_id, round(score / total, 4))
+                for product_id, score in heapq.nlargest(limit, scores.items(), key=itemgetter(1))
+                if score >= min_score]
+
+    def stats(self):
+        with self._lock:
+            containers = (self._documents, self._primary, self._description, self._vocabulary, self._grams)
+            size = sum(sys.getsizeof(container) for container in containers)
+            size += sum(sys.getsizeof(document) for document in self._documents.values())
+            for postings in (self._primary, self._description, self._grams):
+                size += sum(sys.getsizeof(ids) for ids in postings.values())
+            size += sum(sys.getsizeof(word) for word in self._vocabulary)
+            size += sum(sys.getsizeof(gram) for gram in self._grams)
+
+            documents = len(self._documents)
+            return {
+                'documents': documents,
+                'words': len(self._vocabulary),
+                'trigrams': len(self._grams),
+                'bytes': size,
+                'bytes_per_10k_products': round(size * 10_000 / documents) if documents else 0,
+            }
+
+
+search_index = TrigramIndex()
+_build_lock = threading.Lock()
+
+SEARCH_COLUMNS = (Product.id, Product.name, Product.description, Product.category)
+
+
+def get_search_index():
+    # Индекс строится один раз на процесс (при старте или первом запросе),
+    # дальше поддерживается инкрементально через события каталога этого процесса
+    # и изменения других процессов из журнала (on_remote_change)
+    if not search_index.built:
+        with _build_lock:
+            if not search_index.built:
+                rows = db.session.query(*SEARCH_COLUMNS).yield_per(1000)
+                search_index.build(row._asdict() for row in rows)
+    return search_index
+
+
+@on_product_change
+def _update_search_index(changes):
+    if not search_index.built:
+        return
+    for change in changes:
+        if change.op == 'delete':
+            search_index.remove(change.product_id)
+        else:
+            search_index.upsert(change.product_id, change.data)
+
+
+# Товары, измененные другими процессами (воркерами, seed_db.py, add_products.py),
+# перечитываются из БД: пропавшие удаляются из индекса
+@on_remote_change
+def _sync_search_index(product_ids):
+    if not search_index.built:
+        return
+    rows = load_product_rows(SEARCH_COLUMNS, product_ids)
+    for product_id in product_ids:
+        if product_id in rows:
+            search_index.upsert(product_id, rows[product_id])
+        else:
+            search_index.remove(product_id)
@@ -0,0 +1,163 @@
+# backend/specs.py
+import re
+
+from models import db, Product
+from sqlalchemy import inspect, text, type_coerce
+from sqlalchemy.dialects.postgresql import JSONB
+
+# Характеристики товара в Product.attributes: ключ -> тип значения.
+# Фильтровать каталог можно только по этим ключам
+SPEC_KEYS = {
+    'ram_gb': float,
+    'storage_gb': float,
+    'screen_in': float,
+    'camera_mp': float,
+    'refresh_hz': float,
+    'resolution': str,
+    'panel': str,
+}
+NUMERIC_SPEC_KEYS = tuple(key for key, kind in SPEC_KEYS.items() if kind is float)
+
+# В PostgreSQL: GIN-индекс (jsonb_path_ops) для фильтров на равенство через @>
+# и индексы по выражению для диапазонов по числовым характеристикам. Выражение в индексе
+# должно совпадать с тем, что строит spec_value(), иначе планировщик индекс не возьмет
+SPECS_DDL = [
+    "ALTER TABLE product ADD COLUMN IF NOT EXISTS attributes jsonb",
+    "CREATE INDEX IF NOT EXISTS ix_product_attributes ON product USING GIN (attributes jsonb_path_ops)",
+] + [
+    f"CREATE INDEX IF NOT EXISTS ix_product_spec_{key} ON product (CAST((attributes ->> '{key}') AS FLOAT))"
+    for key in NUMERIC_SPEC_KEYS
+]
+
+SPEC_OPERATORS = ('eq', 'min', 'max')
+
+
+# Добавляет колонку attributes в уже созданную таблицу и индексы (идемпотентно)
+def ensure_specs():
+    if db.engine.dialect.name == 'postgresql':
+        for statement in SPECS_DDL:
+            db.session.execute(text(statement))
+        db.session.commit()
+        return
+
+    columns = {column['name'] for column in inspect(db.engine).get_columns('product')}
+    if 'attributes' not in columns:
+        db.session.execute(text("ALTER TABLE product ADD COLUMN attributes JSON"))
+        db.session.commit()
+
+
+# ?spec.ram_gb=16, ?spec.screen_in.min=55, ?spec.panel=OLED -> кортеж (ключ, оператор, значение)
+def parse_spec_filters(args):
+    specs = []
+    for name, value in args.items():
+        if not name.startswith('spec.'):
+            continue
+        key, _, operator = name[len('spec.'):].partition('.')
+        operator = operator or 'eq'
+        if key not in SPEC_KEYS or operator not in SPEC_OPERATORS:
+            raise ValueError(f'Unknown spec filter: {name}')
+        if operator != 'eq' and SPEC_KEYS[key] is not float:
+            raise ValueError(f'Range filter is only available for numeric specs: {name}')
+        try:
+            specs.append((key, operator, SPEC_KEYS[key](value.strip())))
+        except ValueError:
+            raise ValueError(f'Invalid value for {name}: {value}')
+    return tuple(sorted(specs))
+
+
+def spec_value(key):
+    if SPEC_KEYS[key] is float:
+        return Product.attributes[key].as_float()
+    return Product.attributes[key].as_string()
+
+
+def apply_spec_filters(query, specs):
+    if not specs:
+        return query
+
+    equal = {key: value for key, operator, value in specs if operator == 'eq'}
+    if equal and db.engine.dialect.name == 'postgresql':
+        # Все равенства одним @> — это условие обслуживает GIN-индекс
+        query = query.filter(type_coerce(Product.attributes, JSONB).contains(equal))
+    else:
+        for key, value in equal.items():
+            query = query.filter(spec_value(key) == value)
+
+    for key, operator, value in specs:
+        if operator == 'min':
+            query = query.filter(spec_value(key) >= value)
+        elif operator == 'max':
+            query = query.filter(spec_value(key) <= value)
+    return query
+
+
+# Та же проверка в Python, для сброса закэшированных страниц при изменении товара
+def matches_specs(attributes, specs):
+    attributes = attributes or {}
+    for key, operator, value in specs:
+        actual = attributes.get(key)
+        if actual is None:
+            return False
+        if operator == 'eq' and actual != value:
+            return False
+        if operator == 'min' and actual < value:
+            return False
+        if operator == 'max' and actual > value:
+            return False
+    return True
+
+
+SPEC_PATTERNS = [
+    ('ram_gb', re.compile(r'(\d+)\s*GB\s+(?:of\s+)?(?:LP)?(?:DDR\d*X?\s+)?RAM\b', re.I), float),
+    ('storage_gb', re.compile(r'(\d+(?:\.\d+)?)\s*(TB|GB)\s+(?:SSD|storage|ROM|UFS|NVMe)\b', re.I), None),
+    ('screen_in', re.compile(r'(\d{1,3}(?:\.\d)?)\s*(?:"|”|\'\'|-?inch(?:es)?\b|-дюйм)', re.I), float),
+    ('camera_mp', re.compile(r'(\d{1,3})\s*MP\b', re.I), float),
+    ('refresh_hz', re.compile(r'(\d{2,3})\s*Hz\b', re.I), float),
+    ('resolution', re.compile(r'\b(8K|4K|QHD|Full HD|FHD)\b', re.I), None),
+    ('panel', re.compile(r'\b(Mini-LED|QLED|AMOLED|OLED|IPS)\b', re.I), None),
+]
+
+
+# Разбирает характеристики из свободного текста: '16GB RAM', '65"', '1TB SSD', '120Hz'
+def parse_specs(*texts):
+    text_value = ' '.join(value for value in texts if value)
+    specs = {}
+    for key, pattern, kind in SPEC_PATTERNS:
+        match = pattern.search(text_value)
+        if not match:
+            continue
+        if key == 'storage_gb':
+            specs[key] = float(match.group(1)) * (1024 if match.group(2).upper() == 'TB' else 1)
+        elif key == 'resolution':
+            value = match.group(1).upper()
+            specs[key] = 'FHD' if value in ('FULL HD', 'FHD') else value
+        elif key == 'panel':
+            value = match.group(1)
+            specs[key] = 'Mini-LED' if value.lower() == 'mini-led' else value.upper()
+        else:
+            specs[key] = kind(match.group(1))
+    return specs
+
+
+# Заполняет attributes из названия и описания. Идет пачками через ORM, чтобы изменения
+# попадали в журнал изменений и кэши, как обычное редактирование товара.
+# overwrite=False — только товары, у которых характеристик еще нет
+def backfill_specs(overwrite=False, batch_size=1000):
+    updated = 0
+    last_id = 0
+    while True:
+        query = Product.query.filter(Product.id > last_id)
+        if not overwrite:
+            query = query.filter(Product.attributes.is_(None))
+        products = query.order_by(Product.id).limit(batch_size).all()
+        if not products:
+            break
+
+        for product in products:
+            specs = parse_specs(product.name, product.description)
+            if specs != (product.attributes or {}):
+                product.attributes = specs
+                updated += 1
+        last_id = products[-1].id
+        db.session.commit()
+    return updated
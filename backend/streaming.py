@@ -0,0 +1,44 @@
+# backend/streaming.py
+from flask import Response, current_app, stream_with_context
+
+# Сколько строк читается из БД за раз (yield_per) и сколько закодированных
+# элементов отправляется клиенту одним куском
+STREAM_CHUNK_SIZE = 500
+
+
+# Ответ вида {"<key>": [...]}, который кодируется по мере чтения строк: в памяти
+# держится только текущая пачка, а не весь результат. Если запрос упадет посреди
+# выдачи, заголовки уже отправлены — ошибка только логируется, JSON останется неполным.
+# В колоночном формате перед списком идет "columns", взятые из первой строки
+def stream_json_array(key, query, serialize, chunk_size=STREAM_CHUNK_SIZE, columnar=False):
+    dumps = current_app.json.dumps
+
+    def opening(columns):
+        if columnar:
+            return '{"columns":' + dumps(columns or []) + ',' + dumps(key) + ':['
+        return '{' + dumps(key) + ':['
+
+    def generate():
+        columns = None
+        opened = False
+        chunk = []
+        try:
+            # yield_per читает результат пачками (в PostgreSQL через серверный курсор)
+            for row in query.yield_per(chunk_size):
+                data = serialize(row)
+                if columnar:
+                    columns = columns or list(data)
+                    data = list(data.values())
+                chunk.append(dumps(data))
+                if len(chunk) >= chunk_size:
+                    yield (',' if opened else opening(columns)) + ','.join(chunk)
+                    opened = True
+                    chunk = []
+            if chunk or not opened:
+                yield (',' if opened else opening(columns)) + ','.join(chunk)
+        except Exception as e:
+            print(f"Error while streaming {key}: {str(e)}")
+            raise
+        yield ']}\n'
+
+    return Response(stream_with_context(generate()), mimetype=current_app.json.mimetype)
@@ -0,0 +1,170 @@
+# backend/suggest_index.py
+import heapq
+import threading
+from bisect import bisect_left, insort
+
+from catalog_events import on_product_change
+from catalog_version import load_product_rows, on_remote_change
+from models import db, Product
+
+# Диапазоны длиннее этого не сканируются на каждый запрос: их топ кэшируется
+# до следующего изменения каталога (это короткие префиксы вроде "s" или "sa")
+SCAN_LIMIT = 2000
+MAX_CACHED_LIMIT = 20
+
+
+def normalize(text):
+    return ' '.join((text or '').lower().split())
+
+
+def name_keys(name):
+    # Подсказка находится по началу любого слова названия: "qled" -> "Samsung QLED 4K"
+    words = normalize(name).split(' ')
+    return [' '.join(words[i:]) for i in range(len(words)) if words[i]]
+
+
+# Вес для ранжирования подсказок: сейчас это остаток на складе
+def suggestion_weight(product):
+    return product.get('stock') or 0
+
+
+class PrefixIndex:
+    # Отсортированный массив (ключ, id товара) и bisect: все ключи с заданным
+    # префиксом лежат одним непрерывным диапазоном
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+        self.built = False
+
+    def _reset(self):
+        self._keys = []
+        self._products = {}
+        self._categories = {}
+        self._top_cache = {}
+
+    def build(self, products):
+        with self._lock:
+            self._reset()
+            keys = []
+            for product in products:
+                keys.extend(self._register(product['id'], product))
+            keys.sort()
+            self._keys = keys
+            self.built = True
+
+    def upsert(self, product_id, product):
+        with self._lock:
+            self._remove(product_id)
+            for key in self._register(product_id, product):
+                insort(self._keys, key)
+            self._top_cache.clear()
+
+    def remove(self, product_id):
+        with self._lock:
+            self._remove(product_id)
+            self._top_cache.clear()
+
+    def _register(self, product_id, product):
+        keys = [(key, product_id) for key in name_keys(product.get('name'))]
+        category = product.get('category')
+        weight = suggestion_weight(product)
+        self._products[product_id] = (product.get('name'), category, weight, keys)
+        if category:
+            count, total = self._categories.get(category, (0, 0))
+            self._categories[category] = (count + 1, total + weight)
+        return keys
+
+    def _remove(self, product_id):
+        entry = self._products.pop(product_id, None)
+        if entry is None:
+            return
+        _, category, weight, keys = entry
+        for key in keys:
+            position = bisect_left(self._keys, key)
+            if position < len(self._keys) and self._keys[position] == key:
+                del self._keys[position]
+        if category in self._categories:
+            count, total = self._categories[category]
+            if count <= 1:
+                del self._categories[category]
+            else:
+                self._categories[category] = (count - 1, total - weight)
+
+    def _top_products(self, prefix, limit):
+        lo = bisect_left(self._keys, (prefix,))
+        hi = bisect_left(self._keys, (prefix + '\uffff',))
+        if hi - lo <= SCAN_LIMIT:
+            return self._rank(self._keys[lo:hi], limit)
+
+        cached = self._top_cache.get(prefix)
+        if cached is None:
+            cached = self._top_cache[prefix] = self._rank(self._keys[lo:hi], MAX_CACHED_LIMIT)
+        return cached[:limit]
+
+    def _rank(self, keys, limit):
+        ids = {product_id for _, product_id in keys}
+        products = self._products
+        return heapq.nlargest(limit, ids, key=lambda product_id: (products[product_id][2], -product_id))
+
+    def suggest(self, query, limit=8):
+        prefix = normalize(query)
+        if not prefix:
+            return {'products': [], 'categories': []}
+
+        with self._lock:
+            product_ids = self._top_products(prefix, limit)
+            products = [
+                {'id': product_id, 'name': self._products[product_id][0], 'category': self._products[product_id][1]}
+                for product_id in product_ids
+            ]
+            categories = heapq.nlargest(
+                limit,
+                ((name, count, total) for name, (count, total) in self._categories.items()
+                 if any(key.startswith(prefix) for key in name_keys(name))),
+                key=lambda category: category[2]
+            )
+
+        return {
+            'products': products,
+            'categories': [{'name': name, 'count': count} for name, count, _ in categories],
+        }
+
+
+suggest_index = PrefixIndex()
+_build_lock = threading.Lock()
+
+SUGGEST_COLUMNS = (Product.id, Product.name, Product.category, Product.stock)
+
+
+def get_suggest_index():
+    if not suggest_index.built:
+        with _build_lock:
+            if not suggest_index.built:
+                rows = db.session.query(*SUGGEST_COLUMNS).yield_per(1000)
+                suggest_index.build(row._asdict() for row in rows)
+    return suggest_index
+
+
+@on_product_change
+def _update_suggest_index(changes):
+    if not suggest_index.built:
+        return
+    for change in changes:
+        if change.op == 'delete':
+            suggest_index.remove(change.product_id)
+        else:
+            suggest_index.upsert(change.product_id, change.data)
+
+
+# Как и в search_index.py: изменения других процессов перечитываются из БД
+@on_remote_change
+def _sync_suggest_index(product_ids):
+    if not suggest_index.built:
+        return
+    rows = load_product_rows(SUGGEST_COLUMNS, product_ids)
+    for product_id in product_ids:
+        if product_id in rows:
+            suggest_index.upsert(product_id, rows[product_id])
+        else:
+            suggest_index.remove(product_id)
@@ -0,0 +1,57 @@
+# backend/test_compression.py
+# Сжатые ответы каталога кэшируются по ETag; колоночный и обычный JSON —
+# разные тела, и клиент одного формата не должен получить закэшированное тело другого.
+#
+#   python -m pytest test_compression.py
+import gzip
+import json
+import os
+import tempfile
+
+_db_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+os.environ['DATABASE_URL'] = f"sqlite:///{_db_file.name}"
+
+import pytest
+
+from app import create_app
+from compression import gzip_cache
+from models import db, Product
+from response_format import COLUMNAR_MIMETYPE
+
+
+@pytest.fixture(scope='module')
+def client():
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([Product(name=f'Samsung QLED S{i}', description='4K Smart TV' * 5,
+                                    price=100_000.0 + i, stock=10, category='TV') for i in range(30)])
+        db.session.commit()
+    yield app.test_client()
+    os.unlink(_db_file.name)
+
+
+def get_json(client, accept):
+    response = client.get('/api/products/', headers={'Accept': accept, 'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    return response, json.loads(gzip.decompress(response.get_data()))
+
+
+def test_json_after_columnar_is_not_served_from_columnar_cache(client):
+    gzip_cache.clear()
+    columnar, body = get_json(client, COLUMNAR_MIMETYPE)
+    assert 'columns' in body
+
+    plain, body = get_json(client, 'application/json')
+    assert 'columns' not in body
+    assert isinstance(body['products'][0], dict)
+    assert plain.headers['ETag'] != columnar.headers['ETag']
+
+
+def test_columnar_etag_does_not_revalidate_json(client):
+    columnar, _ = get_json(client, COLUMNAR_MIMETYPE)
+    response = client.get('/api/products/', headers={'Accept': 'application/json',
+                                                     'If-None-Match': columnar.headers['ETag']})
+    assert response.status_code == 200
+    assert 'columns' not in response.get_json()
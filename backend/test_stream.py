@@ -0,0 +1,22 @@
+# backend/test_stream.py
+# Потоковая выдача GET /api/admin/orders не держит весь ответ в памяти: рост RSS
+# за время выгрузки остается под BENCH_MAX_RSS_GROWTH_MB. Замер из bench_stream.py
+# на STREAM_TEST_ORDERS заказах (по умолчанию 100 000; сам бенчмарк — на миллионе).
+#
+#   python -m pytest test_stream.py
+#   STREAM_TEST_ORDERS=1000000 python -m pytest test_stream.py
+import os
+
+from bench_stream import MAX_RSS_GROWTH, measure
+
+ORDER_COUNT = int(os.getenv('STREAM_TEST_ORDERS', 100_000))
+
+
+def test_admin_orders_stream_memory_does_not_grow_with_orders():
+    results = measure(ORDER_COUNT)
+    assert [count for count, *_ in results] == [ORDER_COUNT // 10, ORDER_COUNT]
+    # Выгружен весь список: в среднем заказ в JSON занимает не меньше сотни байт
+    assert results[-1][1] > ORDER_COUNT * 100
+
+    worst = max(growth for _, _, growth, _ in results)
+    assert worst <= MAX_RSS_GROWTH, f"RSS grew by {worst / 2 ** 20:.1f} MB"
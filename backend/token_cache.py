@@ -0,0 +1,44 @@
+# backend/token_cache.py
+import hashlib
+import time
+
+from flask import current_app
+from flask_jwt_extended import JWTManager
+
+from catalog_cache import LRUCache
+
+# Проверенные токены: SHA-256 токена -> его claims. SPA присылает один и тот же токен
+# в каждом запросе, и повторно разбирать base64, считать HMAC и проверять claims не нужно.
+# Ключ — хэш всего токена вместе с подписью, поэтому измененный токен в кэш не попадет.
+# Отзыв токена (token_in_blocklist_loader) проверяется после разбора, то есть и для
+# токенов из кэша
+verified_tokens = LRUCache('verified_tokens', maxsize=10000, ttl=300)
+
+
+def init_token_cache(app):
+    verified_tokens.configure(max(app.config['AUTH_TOKEN_CACHE_SIZE'], 1), app.config['AUTH_TOKEN_CACHE_TTL'])
+    # После смены ключа подписи старые записи недействительны
+    verified_tokens.clear()
+
+
+def token_digest(encoded_token):
+    return hashlib.sha256(encoded_token.encode()).digest()
+
+
+class CachingJWTManager(JWTManager):
+    # JWTManager, который перед полной проверкой токена смотрит в verified_tokens
+
+    def _decode_jwt_from_config(self, encoded_token, csrf_value=None, allow_expired=False):
+        # Запросы с CSRF-токеном и разбор просроченных токенов идут обычным путем
+        if csrf_value or allow_expired or not current_app.config['AUTH_TOKEN_CACHE_SIZE']:
+            return super()._decode_jwt_from_config(encoded_token, csrf_value, allow_expired)
+
+        key = token_digest(encoded_token)
+        found, claims = verified_tokens.get(key)
+        # Истекший токен из кэша не отдается: полная проверка вернет обычную ошибку expired
+        if found and ('exp' not in claims or claims['exp'] > time.time()):
+            return dict(claims)
+
+        claims = super()._decode_jwt_from_config(encoded_token, csrf_value, allow_expired)
+        verified_tokens.set(key, claims)
+        return dict(claims)
@@ -0,0 +1,34 @@
+# backend/upsert.py
+from sqlalchemy import update
+from sqlalchemy.dialects import postgresql, sqlite
+
+# Диалекты, в которых есть INSERT ... ON CONFLICT DO UPDATE
+UPSERT_DIALECTS = {'postgresql': postgresql, 'sqlite': sqlite}
+
+
+# Вставляет строки rows (словари колонка -> значение) в table, а строки, уже существующие
+# по ключу keys, обновляет: колонки increment увеличиваются на новое значение, колонки
+# replace заменяются им. Все строки — одним executemany; порядок строк задает вызывающий
+# (по ключу, чтобы параллельные транзакции брали блокировки в одном порядке).
+# В других СУБД — UPDATE каждой строки и INSERT, если обновлять было нечего
+def upsert(connection, table, rows, keys, increment=(), replace=()):
+    if not rows:
+        return
+
+    dialect = UPSERT_DIALECTS.get(connection.dialect.name)
+    if dialect is not None:
+        statement = dialect.insert(table)
+        set_ = {name: table.c[name] + statement.excluded[name] for name in increment}
+        set_.update((name, statement.excluded[name]) for name in replace)
+        statement = statement.on_conflict_do_update(index_elements=[table.c[name] for name in keys], set_=set_)
+        connection.execute(statement, rows)
+        return
+
+    for row in rows:
+        values = {name: table.c[name] + row[name] for name in increment}
+        values.update((name, row[name]) for name in replace)
+        result = connection.execute(
+            update(table).where(*[table.c[name] == row[name] for name in keys]).values(**values)
+        )
+        if result.rowcount == 0:
+            connection.execute(table.insert().values(**row))
@@ -0,0 +1,142 @@
+# backend/view_counter.py
+import atexit
+import threading
+import time
+from datetime import datetime
+
+from models import db, ProductStats
+from sqlalchemy.exc import OperationalError
+from upsert import upsert
+
+# Просмотры карточек копятся в памяти процесса и раз в VIEW_FLUSH_INTERVAL секунд
+# записываются в product_stats одним пакетным upsert. Счетчики разбиты на полосы
+# со своими блокировками по product_id, чтобы параллельные запросы к разным товарам
+# не ждали друг друга. Число товаров в памяти ограничено (VIEW_BUFFER_SIZE): просмотры
+# новых товаров сверх предела не учитываются, пока сброс не освободит место
+STRIPES = 16
+
+
+class ViewCounter:
+    def __init__(self, stripes=STRIPES, maxsize=100_000):
+        self._stripes = [(threading.Lock(), {}) for _ in range(stripes)]
+        self.maxsize = maxsize
+        # Отброшенные просмотры считаются по полосам, под блокировкой своей полосы
+        self._dropped = [0] * stripes
+
+    @property
+    def dropped(self):
+        return sum(self._dropped)
+
+    # Возвращает False, если товар не поместился в буфер и просмотры отброшены
+    def add(self, product_id, count=1):
+        stripe = product_id % len(self._stripes)
+        lock, counts = self._stripes[stripe]
+        with lock:
+            if product_id not in counts and len(counts) >= self.maxsize // len(self._stripes):
+                self._dropped[stripe] += count
+                return False
+            counts[product_id] = counts.get(product_id, 0) + count
+        return True
+
+    # Забирает накопленное и обнуляет счетчики
+    def drain(self):
+        drained = {}
+        for lock, counts in self._stripes:
+            with lock:
+                drained.update(counts)
+                counts.clear()
+        return drained
+
+
+view_counter = ViewCounter()
+
+_state = {'app': None, 'timer': None}
+_timer_lock = threading.Lock()
+# Сброс выполняется одним потоком за раз: таймер и завершение процесса могут совпасть
+_flush_lock = threading.Lock()
+
+
+def init_view_counter(app):
+    # Накопленное за последний интервал записывается при штатной остановке процесса
+    if _state['app'] is None:
+        atexit.register(flush_views)
+    _state['app'] = app
+    view_counter.maxsize = max(app.config['VIEW_BUFFER_SIZE'], STRIPES)
+
+
+def record_view(product_id):
+    app = _state['app']
+    if app is None or not app.config['VIEW_TRACKING']:
+        return
+    view_counter.add(product_id)
+    _ensure_timer(app)
+
+
+def _ensure_timer(app):
+    if _state['timer'] is not None:
+        return
+    with _timer_lock:
+        if _state['timer'] is None:
+            _state['timer'] = threading.Thread(target=_flush_loop, args=(app,), daemon=True)
+            _state['timer'].start()
+
+
+def _flush_loop(app):
+    while True:
+        time.sleep(app.config['VIEW_FLUSH_INTERVAL'])
+        flush_views()
+
+
+def _write_views(connection, counts):
+    now = datetime.utcnow()
+    upsert(connection, ProductStats.__table__, [
+        {'product_id': product_id, 'view_count': count, 'updated_at': now}
+        for product_id, count in sorted(counts.items())
+    ], keys=('product_id',), increment=('view_count',), replace=('updated_at',))
+
+
+# Пишет пакет одной транзакцией и убирает записанное из pending. Если пакет отвергнут
+# из-за данных (а не недоступности БД), он делится пополам, пока не останутся отдельные
+# плохие товары — их просмотры отбрасываются, остальные записываются.
+# Возвращает число записанных товаров
+def _write_batch(counts, pending):
+    try:
+        with db.engine.begin() as connection:
+            _write_views(connection, counts)
+    except OperationalError:
+        raise
+    except Exception as e:
+        if len(counts) == 1:
+            product_id = next(iter(counts))
+            print(f"Dropping views for product {product_id}: {str(e)}")
+            pending.pop(product_id, None)
+            return 0
+        items = sorted(counts.items())
+        middle = len(items) // 2
+        return _write_batch(dict(items[:middle]), pending) + _write_batch(dict(items[middle:]), pending)
+
+    for product_id in counts:
+        pending.pop(product_id, None)
+    return len(counts)
+
+
+# Записывает накопленные просмотры на отдельном соединении, в обход сессии запроса.
+# Если БД недоступна, незаписанные счетчики возвращаются в память (в пределах
+# VIEW_BUFFER_SIZE) и уйдут со следующим сбросом. Возвращает число записанных товаров
+def flush_views():
+    app = _state['app']
+    if app is None:
+        return 0
+    with _flush_lock:
+        counts = view_counter.drain()
+        if not counts:
+            return 0
+        pending = dict(counts)
+        try:
+            with app.app_context():
+                return _write_batch(counts, pending)
+        except Exception as e:
+            print(f"Error flushing product views: {str(e)}")
+            for product_id, count in pending.items():
+                view_counter.add(product_id, count)
+            return 0
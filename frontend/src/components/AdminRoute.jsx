@@ -5,7 +5,7 @@ import useAuthStore from '../store/authStore';
 
 const AdminRoute = ({ children }) => {
     const { user } = useAuthStore();
-    const isAdmin = user?.email === 'admin@example.com';
+    const isAdmin = user?.is_admin || false;
 
     if (!isAdmin) {
         return <Navigate to="/" replace />;
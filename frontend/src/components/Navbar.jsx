@@ -8,7 +8,7 @@ const Navbar = () => {
     const { token, user, logout } = useAuthStore()
     const { totalItems, resetCart } = useCartStore()
 
-    const isAdmin = user?.email === 'admin@example.com'
+    const isAdmin = user?.is_admin || false
 
     const handleLogout = () => {
         resetCart(); // Очищаем корзину при выходе
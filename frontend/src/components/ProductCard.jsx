@@ -39,7 +39,6 @@ const ProductCard = ({ product }) => {
             />
             <div className="card-body d-flex flex-column">
                 <h5 className="card-title">{product.name}</h5>
-                <p className="card-text">{product.description}</p>
                 <p className="card-text fw-bold">₸{product.price.toLocaleString()}</p>
                 <button
                     className="btn btn-primary mt-auto"
@@ -57,7 +56,6 @@ ProductCard.propTypes = {
     product: PropTypes.shape({
         id: PropTypes.number.isRequired,
         name: PropTypes.string.isRequired,
-        description: PropTypes.string.isRequired,
         price: PropTypes.number.isRequired,
         stock: PropTypes.number.isRequired,
         image_url: PropTypes.string.isRequired,
@@ -28,7 +28,7 @@ const Login = () => {
                 localStorage.setItem('token', response.token)
                 setToken(response.token, response.user)
 
-                if (response.user.email === 'admin@example.com') {
+                if (response.user.is_admin) {
                     navigate('/admin')
                 } else {
                     navigate('/')
@@ -1,5 +1,5 @@
 // src/pages/ProductList.jsx
-import React, { useState, useEffect } from 'react'
+import React, { useState, useEffect, useRef } from 'react'
 import { getProducts } from '../services/api'
 import ProductCard from '../components/ProductCard'
 
@@ -7,7 +7,12 @@ const ProductList = () => {
     const [products, setProducts] = useState([])
     const [categories, setCategories] = useState([])
     const [loading, setLoading] = useState(true)
+    const [loadingMore, setLoadingMore] = useState(false)
     const [error, setError] = useState(null)
+    // Курсор следующей страницы каталога (null — страниц больше нет)
+    const [nextCursor, setNextCursor] = useState(null)
+    // Номер текущего набора фильтров: страница, запрошенная до их смены, не дописывается
+    const generation = useRef(0)
 
     const [filters, setFilters] = useState({
         search: '',
@@ -17,6 +22,7 @@ const ProductList = () => {
     })
 
     const fetchProducts = async () => {
+        generation.current += 1
         try {
             setLoading(true)
             setError(null)
@@ -29,9 +35,11 @@ const ProductList = () => {
             if (response && response.products) {
                 setProducts(response.products)
                 setCategories(response.categories || [])
+                setNextCursor(response.next_cursor || null)
             } else if (Array.isArray(response)) {
                 // Если ответ - просто массив продуктов
                 setProducts(response)
+                setNextCursor(null)
             } else {
                 throw new Error('Invalid response format')
             }
@@ -43,6 +51,24 @@ const ProductList = () => {
         }
     }
 
+    // Следующая страница запрашивается с теми же фильтрами и курсором из предыдущего ответа
+    const loadMore = async () => {
+        if (!nextCursor || loadingMore) return
+        try {
+            setLoadingMore(true)
+            const requested = generation.current
+            const response = await getProducts({ ...filters, cursor: nextCursor })
+            if (requested !== generation.current) return
+            setProducts(prev => [...prev, ...(response.products || [])])
+            setNextCursor(response.next_cursor || null)
+        } catch (err) {
+            console.error('Error fetching more products:', err)
+            setError('Failed to load products')
+        } finally {
+            setLoadingMore(false)
+        }
+    }
+
     useEffect(() => {
         fetchProducts()
     }, [filters])
@@ -150,6 +176,18 @@ const ProductList = () => {
                     ))
                 )}
             </div>
+
+            {nextCursor && (
+                <div className="text-center mb-4">
+                    <button
+                        className="btn btn-outline-primary"
+                        onClick={loadMore}
+                        disabled={loadingMore}
+                    >
+                        {loadingMore ? 'Loading...' : 'Load more'}
+                    </button>
+                </div>
+            )}
         </div>
     )
 }
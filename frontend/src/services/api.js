@@ -90,6 +90,9 @@ export const createOrder = async (orderData) => {
 export const getOrder = (id) => api.get(`/orders/${id}`)
 export const getProducts = (params) => api.get('/products/', { params })
 export const getProduct = (id) => api.get(`/products/${id}`)
+export const getProductChanges = (since) => api.get('/products/changes', { params: { since } })
+export const getProductsBatch = (ids) => api.get('/products/batch', { params: { ids: ids.join(',') } })
+export const getRelatedProducts = (id) => api.get(`/products/${id}/related`)
 export const getOrders = () => api.get('/orders/')
 export const getAllOrders = () => api.get('/admin/orders')
 export const updateOrderStatus = (orderId, data) => api.post(`/admin/orders/${orderId}/update-status`, data)